@@ -0,0 +1,44 @@
+"""
+Helpers shared by the rendering benchmarks: keeping their trace and cache
+out of the real ones, timing one render through VideoEditor.assemble_video
+and scoring it against a reference render.
+"""
+import os
+import re
+import subprocess
+import time
+from pathlib import Path
+from src.cache import artifact_cache
+from src.tracing import tracer
+from src.video_ffmpeg import video_editor
+
+
+def isolate(tmp):
+    """Sends spans and cached overlays to tmp, leaving trace.jsonl and cache/ of real runs alone."""
+    tracer.trace_file = os.path.join(tmp, "trace.jsonl")
+    artifact_cache.root = Path(tmp) / "cache"
+
+
+def render(scenes, audio_path, out_path, tmp):
+    """Renders with video_editor's current settings; returns (wall, cpu) seconds, FFmpeg children included."""
+    before = os.times()
+    start = time.perf_counter()
+    ok = video_editor.assemble_video(scenes, audio_path, out_path, tmp)
+    wall = time.perf_counter() - start
+    after = os.times()
+    if not ok:
+        raise RuntimeError(f"Render failed: {out_path}")
+    cpu = (after.children_user - before.children_user) + (after.children_system - before.children_system)
+    return wall, cpu
+
+
+def compare(video_path, reference_path):
+    """(SSIM, PSNR) of video_path against reference_path; PSNR is a string ("inf" for identical frames)."""
+    result = subprocess.run(
+        ["ffmpeg", "-i", video_path, "-i", reference_path,
+         "-lavfi", "[0:v][1:v]ssim;[0:v][1:v]psnr", "-f", "null", "-"],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+    )
+    ssim = re.search(r"SSIM .*All:([\d.]+)", result.stderr)
+    psnr = re.search(r"PSNR .*average:([\d.]+|inf)", result.stderr)
+    return (float(ssim.group(1)) if ssim else float("nan")), (psnr.group(1) if psnr else "n/a")
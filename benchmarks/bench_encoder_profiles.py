@@ -0,0 +1,72 @@
+"""
+Compares encoder profiles (ENCODER_PROFILE) on speed, size and quality.
+
+A fixed synthetic story (solid-colour scenes with text, a sine tone as
+narration) is rendered through VideoEditor.assemble_video once per profile.
+Quality is scored against a lossless (CRF 0) render of the same story.
+
+Usage:
+    python -m benchmarks.bench_encoder_profiles [--profiles draft standard archive]
+"""
+import argparse
+import os
+import subprocess
+import tempfile
+from src.video_ffmpeg import video_editor
+from benchmarks._common import isolate, render, compare
+
+SCENE_COLOURS = ["0x1f3b73", "0x8c2f39", "0x2e6b3a", "0xc9a227"]
+SCENE_SECONDS = 5
+
+
+def make_story(tmp):
+    scenes = []
+    for idx, colour in enumerate(SCENE_COLOURS):
+        image_path = os.path.join(tmp, f"scene_{idx}.png")
+        subprocess.run(
+            ["ffmpeg", "-y", "-v", "error", "-f", "lavfi",
+             "-i", f"color=c={colour}:s={video_editor.width}x{video_editor.height}",
+             "-frames:v", "1", image_path],
+            check=True
+        )
+        scenes.append({"image_path": image_path, "text": f"Benchmark scene {idx + 1}", "duration": SCENE_SECONDS})
+
+    audio_path = os.path.join(tmp, "narration.mp3")
+    subprocess.run(
+        ["ffmpeg", "-y", "-v", "error", "-f", "lavfi",
+         "-i", f"sine=frequency=330:duration={len(SCENE_COLOURS) * SCENE_SECONDS}", audio_path],
+        check=True
+    )
+    return scenes, audio_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", nargs="+", default=None, help="Profiles to compare (default: all)")
+    args = parser.parse_args()
+    profiles = args.profiles or list(video_editor.encoder_profiles)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        isolate(tmp)
+        scenes, audio_path = make_story(tmp)
+
+        # Lossless reference of the exact same graph
+        video_editor.encoder_profiles["_reference"] = dict(
+            video_editor.encoder_profiles["standard"], preset="ultrafast", crf=0
+        )
+        reference = os.path.join(tmp, "reference.mp4")
+        video_editor.encoder_profile = "_reference"
+        render(scenes, audio_path, reference, tmp)
+
+        print(f"{'profile':<10} {'wall s':>8} {'cpu s':>8} {'size KB':>9} {'SSIM':>8} {'PSNR dB':>8}")
+        for profile in profiles:
+            out_path = os.path.join(tmp, f"{profile}.mp4")
+            video_editor.encoder_profile = profile
+            wall, cpu = render(scenes, audio_path, out_path, tmp)
+            ssim, psnr = compare(out_path, reference)
+            size_kb = os.path.getsize(out_path) / 1024
+            print(f"{profile:<10} {wall:>8.2f} {cpu:>8.2f} {size_kb:>9.0f} {ssim:>8.5f} {psnr:>8}")
+
+
+if __name__ == "__main__":
+    main()
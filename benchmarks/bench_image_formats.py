@@ -0,0 +1,77 @@
+"""
+Compares scene image formats (IMAGE_FORMAT) on save time, size and FFmpeg decode time.
+
+A photo-like synthetic frame (test pattern plus grain) is saved with Pillow
+in each candidate format, at the output size and at the 2x size the zoompan
+engines upscale to. Decode time is what FFmpeg spends per frame reading the
+looped still and scaling it to the zoompan working width, which is what the
+"zoompan" engine pays on every output frame.
+
+Usage:
+    python -m benchmarks.bench_image_formats [--repeat 5] [--frames 50]
+"""
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+from PIL import Image
+from src.video_ffmpeg import video_editor
+
+FORMATS = {
+    "png_optimize": ("PNG", {"optimize": True}),  # previous ImageGenerator output
+    "png_level1": ("PNG", {"compress_level": 1}),
+    "png_raw": ("PNG", {"compress_level": 0}),
+    "jpeg_q95": ("JPEG", {"quality": 95}),
+}
+
+
+def make_source(tmp, width, height):
+    path = os.path.join(tmp, f"source_{width}x{height}.png")
+    subprocess.run(
+        ["ffmpeg", "-y", "-v", "error", "-f", "lavfi",
+         "-i", f"testsrc2=s={width}x{height},noise=alls=12:allf=t",
+         "-frames:v", "1", path],
+        check=True
+    )
+    return Image.open(path).convert("RGB")
+
+
+def time_save(img, path, fmt, options, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        img.save(path, format=fmt, **options)
+    return (time.perf_counter() - start) / repeat
+
+
+def time_decode(path, frames, working_width):
+    cmd = [
+        "ffmpeg", "-v", "error", "-loop", "1", "-framerate", "25", "-i", path,
+        "-frames:v", str(frames), "-vf", f"scale={working_width}:-1", "-f", "null", "-"
+    ]
+    start = time.perf_counter()
+    subprocess.run(cmd, check=True)
+    return (time.perf_counter() - start) / frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Saves per format (averaged)")
+    parser.add_argument("--frames", type=int, default=50, help="Looped frames decoded per format")
+    args = parser.parse_args()
+
+    w, h = video_editor.width, video_editor.height
+    print(f"{'format':<13} {'size':>9} {'save ms':>8} {'file KB':>8} {'decode+scale ms/frame':>22}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for width, height in ((w, h), (2 * w, 2 * h)):
+            img = make_source(tmp, width, height)
+            for name, (fmt, options) in FORMATS.items():
+                path = os.path.join(tmp, f"{name}_{width}.{'jpg' if fmt == 'JPEG' else 'png'}")
+                save = time_save(img, path, fmt, options, args.repeat)
+                decode = time_decode(path, args.frames, 2 * w)
+                print(f"{name:<13} {f'{width}x{height}':>9} {save * 1000:>8.1f} "
+                      f"{os.path.getsize(path) / 1024:>8.0f} {decode * 1000:>22.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Compares Ken Burns motion engines (MOTION_ENGINE) on encode time per output second.
+
+A synthetic story (test-pattern scenes, a sine tone as narration) is rendered
+once per engine through VideoEditor.assemble_video, so the numbers cover the
+real filter graph and encoder settings. SSIM/PSNR are measured against the
+original zoompan render: 1.0 / inf means identical frames.
+
+Usage:
+    python -m benchmarks.bench_motion [--scenes 3] [--scene-seconds 5]
+"""
+import argparse
+import os
+import subprocess
+import tempfile
+from src.video_ffmpeg import video_editor
+from benchmarks._common import isolate, render, compare
+
+
+def make_story(tmp, scene_count, scene_seconds):
+    scenes = []
+    for idx in range(scene_count):
+        image_path = os.path.join(tmp, f"scene_{idx}.png")
+        subprocess.run(
+            ["ffmpeg", "-y", "-v", "error", "-f", "lavfi",
+             "-i", f"testsrc2=s={video_editor.width}x{video_editor.height}:d=1",
+             "-vf", f"hue=h={idx * 70}", "-frames:v", "1", image_path],
+            check=True
+        )
+        scenes.append({"image_path": image_path, "text": f"Scene {idx + 1} benchmark text", "duration": scene_seconds})
+
+    audio_path = os.path.join(tmp, "narration.mp3")
+    subprocess.run(
+        ["ffmpeg", "-y", "-v", "error", "-f", "lavfi",
+         "-i", f"sine=frequency=220:duration={scene_count * scene_seconds}", audio_path],
+        check=True
+    )
+    return scenes, audio_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenes", type=int, default=3)
+    parser.add_argument("--scene-seconds", type=float, default=5.0)
+    args = parser.parse_args()
+    output_seconds = args.scenes * args.scene_seconds
+
+    with tempfile.TemporaryDirectory() as tmp:
+        isolate(tmp)
+        scenes, audio_path = make_story(tmp, args.scenes, args.scene_seconds)
+
+        print(f"{'engine':<13} {'wall s':>8} {'cpu s':>8} {'wall/out s':>10} {'cpu/out s':>9} {'SSIM':>7} {'PSNR':>7}")
+        reference = os.path.join(tmp, "zoompan.mp4")
+        engines = ("zoompan",) + tuple(e for e in video_editor.MOTION_ENGINES if e != "zoompan")
+        for engine in engines:
+            out_path = reference if engine == "zoompan" else os.path.join(tmp, f"{engine}.mp4")
+            video_editor.motion_engine = engine
+            wall, cpu = render(scenes, audio_path, out_path, tmp)
+            ssim, psnr = compare(out_path, reference)
+            print(f"{engine:<13} {wall:>8.2f} {cpu:>8.2f} {wall / output_seconds:>10.3f} "
+                  f"{cpu / output_seconds:>9.3f} {ssim:>7.4f} {psnr:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Measures import-time cost of the pipeline modules with `python -X importtime`.
+
+Each target is imported in a fresh interpreter several times. For each one the
+script prints the median cumulative import time of the module itself, the
+median wall time of the whole process, and the slowest packages it pulled
+in (cumulative time of each top-level import). It finishes with the wall time
+of `python -m src.main --help`.
+
+Usage:
+    python -m benchmarks.bench_startup [--repeat 5] [--top 5] [--modules src.main src.pipeline]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+DEFAULT_MODULES = ["src.main", "src.pipeline", "src.upload_queue", "src.run_history", "src.cache"]
+
+
+def parse_importtime(stderr):
+    """[(cumulative_us, depth, name)] from -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(cumulative), depth, name.strip()))
+    return rows
+
+
+def run(argv, repeat, env):
+    walls, runs = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run(argv, capture_output=True, text=True, env=env)
+        walls.append(time.perf_counter() - start)
+        if proc.returncode != 0:
+            raise RuntimeError(f"{' '.join(argv)} failed:\n{proc.stderr[-2000:]}")
+        runs.append(parse_importtime(proc.stderr))
+    return walls, runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per target (medians are shown)")
+    parser.add_argument("--top", type=int, default=5, help="Slowest top-level imports listed per target")
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES)
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root)
+
+    print(f"{'module':<20} {'import ms':>10} {'process ms':>11}  slowest imports (cumulative ms)")
+    for module in args.modules:
+        walls, runs = run([sys.executable, "-X", "importtime", "-c", f"import {module}"], args.repeat, env)
+        own = statistics.median(next(us for us, _, name in reversed(rows) if name == module) for rows in runs)
+
+        # Cost of each package imported under the target (its largest cumulative
+        # entry per run, median over runs). Children are printed before their
+        # parent, so the target's subtree is the deeper block just above it.
+        heavy = {}
+        for rows in runs:
+            end = max(i for i, (_, _, name) in enumerate(rows) if name == module)
+            start = end
+            while start > 0 and rows[start - 1][1] > rows[end][1]:
+                start -= 1
+            per_run = {}
+            for us, depth, name in rows[start:end]:
+                top = name.split(".")[0]
+                if top != "src":
+                    per_run[top] = max(per_run.get(top, 0), us)
+            for top, us in per_run.items():
+                heavy.setdefault(top, []).append(us)
+        slowest = sorted(((statistics.median(v), k) for k, v in heavy.items()), reverse=True)[:args.top]
+        listing = ", ".join(f"{name} {us / 1000:.0f}" for us, name in slowest)
+        print(f"{module:<20} {own / 1000:>10.1f} {statistics.median(walls) * 1000:>11.0f}  {listing}")
+
+    walls, _ = run([sys.executable, "-m", "src.main", "--help"], args.repeat, env)
+    print(f"\n`python -m src.main --help`: {statistics.median(walls) * 1000:.0f} ms wall (median of {args.repeat})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import math
+import re
+import subprocess
+from functools import cached_property
+from src.config_loader import config
+from src.logger import logger
+
+
+class SceneAligner:
+    """
+    Fits scene durations to the narration.
+
+    The narration length is shared out across all scenes in proportion to
+    their weight (on-screen text length, or the durations Gemini planned with
+    ALIGN_WEIGHT=planned). Each cut is then moved to the nearest sentence
+    boundary of the narration within ALIGN_SNAP_SEC, so scenes change between
+    sentences rather than in the middle of one. Cuts land on whole frames and
+    the last scene ends exactly with the narration, so the renderer can use
+    the plan as is.
+
+    Sentence boundaries come from the narration segments (ElevenLabs
+    timestamps or chunk durations) or, failing that, from silence detection.
+    """
+
+    @cached_property
+    def weight(self):
+        return config.settings.get("ALIGN_WEIGHT", "text")
+
+    @cached_property
+    def min_scene(self):
+        return float(config.settings.get("ALIGN_MIN_SCENE_SEC", 2.0))
+
+    @cached_property
+    def snap_window(self):
+        return float(config.settings.get("ALIGN_SNAP_SEC", 1.5))
+
+    @cached_property
+    def silence_detect(self):
+        return bool(config.settings.get("ALIGN_SILENCE_DETECT", True))
+
+    @cached_property
+    def silence_noise_db(self):
+        return float(config.settings.get("ALIGN_SILENCE_NOISE_DB", -35))
+
+    @cached_property
+    def silence_min_sec(self):
+        return float(config.settings.get("ALIGN_SILENCE_MIN_SEC", 0.25))
+
+    def sentence_boundaries(self, segments):
+        """End times of all but the last segment."""
+        return [float(s["start"]) + float(s["duration"]) for s in (segments or [])[:-1]]
+
+    def detect_silences(self, audio_path):
+        """Midpoints of the pauses in the narration, found with FFmpeg's silencedetect."""
+        cmd = [
+            "ffmpeg", "-hide_banner", "-nostats", "-i", str(audio_path),
+            "-af", f"silencedetect=noise={self.silence_noise_db}dB:d={self.silence_min_sec}",
+            "-f", "null", "-"
+        ]
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        starts = [float(t) for t in re.findall(r"silence_start: (-?[\d.]+)", result.stderr)]
+        ends = [float(t) for t in re.findall(r"silence_end: ([\d.]+)", result.stderr)]
+        return [(start + end) / 2 for start, end in zip(starts, ends)]
+
+    def _weights(self, scenes):
+        if self.weight == "planned":
+            return [max(0.1, float(s.get("duration") or 0)) for s in scenes]
+        return [max(1, len((s.get("text") or "").strip())) for s in scenes]
+
+    def plan(self, scenes, total, boundaries=(), fps=25):
+        """
+        Returns copies of scenes with 'start' and 'duration' set so that they
+        cover exactly `total` seconds of narration.
+        """
+        n = len(scenes)
+        if n == 0 or total <= 0:
+            return scenes
+        min_scene = min(self.min_scene, total / n)
+        boundaries = sorted(b for b in boundaries if 0 < b < total)
+
+        weights = self._weights(scenes)
+        weight_sum = sum(weights)
+        cuts = []
+        cumulative = 0.0
+        prev = 0.0
+        snapped = 0
+        for k in range(1, n):
+            cumulative += weights[k - 1]
+            ideal = total * cumulative / weight_sum
+            # Leave room for this scene and every scene still to come
+            low, high = prev + min_scene, total - (n - k) * min_scene
+
+            candidates = [b for b in boundaries if low <= b <= high and abs(b - ideal) <= self.snap_window]
+            if candidates:
+                cut = min(candidates, key=lambda b: abs(b - ideal))
+                snapped += 1
+            else:
+                cut = min(max(ideal, low), high)
+            # Whole frames, so per-scene rounding cannot add up to drift; the bounds
+            # are moved inwards to whole frames too, or clamping would undo it
+            frame_low, frame_high = math.ceil(low * fps - 1e-6) / fps, math.floor(high * fps + 1e-6) / fps
+            cut = round(cut * fps) / fps
+            if frame_low <= frame_high:
+                cut = min(max(cut, frame_low), frame_high)
+            cuts.append(cut)
+            prev = cut
+
+        edges = [0.0] + cuts + [total]
+        planned = []
+        for idx, scene in enumerate(scenes):
+            planned.append(dict(scene, start=round(edges[idx], 3), duration=round(edges[idx + 1] - edges[idx], 3)))
+
+        logger.info(
+            f"Aligned {n} scenes to {total:.2f}s of narration "
+            f"({snapped}/{len(cuts)} cuts on sentence boundaries): "
+            + ", ".join(f"{s['duration']:.2f}s" for s in planned)
+        )
+        return planned
+
+    def align(self, scenes, audio_path, total, segments=None, fps=25):
+        boundaries = self.sentence_boundaries(segments)
+        if not boundaries and len(scenes) > 1 and self.silence_detect:
+            try:
+                boundaries = self.detect_silences(audio_path)
+            except Exception as e:
+                logger.warning(f"Silence detection failed, aligning by weight only: {e}")
+        return self.plan(scenes, total, boundaries, fps)
+
+
+scene_aligner = SceneAligner()
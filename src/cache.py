@@ -0,0 +1,207 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from functools import cached_property
+from src.config_loader import config
+from src.logger import logger
+
+
+class ArtifactCache:
+    """
+    On-disk, content-addressed cache for paid API results (scripts, narration, images).
+
+    Entries live at cache/<namespace>/<key[:2]>/<key> where key is a SHA-256 of the
+    request that produced them. Reading an entry bumps its mtime, so pruning by
+    oldest mtime gives size-based LRU eviction.
+    """
+
+    @cached_property
+    def root(self):
+        return config.root_dir / config.settings.get("CACHE_DIR", "cache")
+
+    @cached_property
+    def max_bytes(self):
+        return int(float(config.settings.get("CACHE_MAX_MB", 2048)) * 1024 * 1024)
+
+    @cached_property
+    def enabled(self):
+        return bool(config.settings.get("CACHE_ENABLED", True))
+
+    @staticmethod
+    def make_key(*parts):
+        """Stable hash of any JSON-serialisable request description."""
+        raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, namespace, key, suffix=""):
+        return self.root / namespace / key[:2] / f"{key}{suffix}"
+
+    def path_for(self, namespace, key, suffix=""):
+        """
+        Direct path of an entry, for derived files that are read in place
+        (e.g. text overlays). Works even when CACHE_ENABLED is false. An
+        existing entry counts as read, like a get_file hit, so prune() keeps
+        the entries that are reused.
+        """
+        path = self._path(namespace, key, suffix)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.exists():
+            self._touch(path)
+        return path
+
+    def _touch(self, path):
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+    def _write_atomic(self, path, write_fn):
+        # Write to a sibling temp file and rename, so readers never see partial entries
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp_")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write_fn(f)
+            os.replace(tmp, path)
+        except Exception:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    def get_file(self, namespace, key, dest):
+        """Copies a cached blob to dest. Returns True on a cache hit."""
+        if not self.enabled:
+            return False
+        path = self._path(namespace, key)
+        if not path.exists():
+            return False
+        try:
+            shutil.copyfile(path, dest)
+        except OSError as e:
+            logger.warning(f"[Cache] Could not read {namespace}/{key[:12]}: {e}")
+            return False
+        self._touch(path)
+        logger.info(f"[Cache] Hit {namespace}/{key[:12]} → {dest}")
+        return True
+
+    def put_file(self, namespace, key, src):
+        if not self.enabled:
+            return
+        try:
+            with open(src, "rb") as source:
+                self._write_atomic(self._path(namespace, key), lambda f: shutil.copyfileobj(source, f))
+        except OSError as e:
+            logger.warning(f"[Cache] Could not store {namespace}/{key[:12]}: {e}")
+
+    def get_json(self, namespace, key):
+        """Returns the cached object, or None on a miss."""
+        if not self.enabled:
+            return None
+        path = self._path(namespace, key)
+        if not path.exists():
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"[Cache] Could not read {namespace}/{key[:12]}: {e}")
+            return None
+        self._touch(path)
+        logger.info(f"[Cache] Hit {namespace}/{key[:12]}")
+        return data
+
+    def put_json(self, namespace, key, data):
+        if not self.enabled:
+            return
+        payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        try:
+            self._write_atomic(self._path(namespace, key), lambda f: f.write(payload))
+        except OSError as e:
+            logger.warning(f"[Cache] Could not store {namespace}/{key[:12]}: {e}")
+
+    def entries(self):
+        """All cache entries as (path, size_bytes, mtime), oldest first."""
+        if not self.root.exists():
+            return []
+        found = []
+        for p in self.root.glob("*/*/*"):
+            if p.is_file() and not p.name.startswith(".tmp_"):
+                st = p.stat()
+                found.append((p, st.st_size, st.st_mtime))
+        found.sort(key=lambda e: e[2])
+        return found
+
+    def stats(self):
+        per_namespace = {}
+        for path, size, _ in self.entries():
+            ns = path.relative_to(self.root).parts[0]
+            count, total = per_namespace.get(ns, (0, 0))
+            per_namespace[ns] = (count + 1, total + size)
+        return per_namespace
+
+    def prune(self, max_bytes=None, namespace=None):
+        """
+        Evicts least recently used entries until the cache fits in max_bytes.
+        Returns (removed_count, freed_bytes).
+        """
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        if namespace:
+            entries = [e for e in entries if e[0].relative_to(self.root).parts[0] == namespace]
+        total = sum(size for _, size, _ in entries)
+
+        removed, freed = 0, 0
+        for path, size, _ in entries:
+            if total <= limit:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+            freed += size
+
+        if removed:
+            logger.info(f"[Cache] Pruned {removed} entries ({freed / 1024 / 1024:.1f} MB)")
+        return removed, freed
+
+
+artifact_cache = ArtifactCache()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and prune the API result cache")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="Show entry count and size per namespace")
+    prune_p = sub.add_parser("prune", help="Evict least recently used entries")
+    prune_p.add_argument("--max-mb", type=float, default=None, help="Target size (default: CACHE_MAX_MB)")
+    prune_p.add_argument("--namespace", default=None, help="Only prune one namespace (images, audio, stories)")
+    clear_p = sub.add_parser("clear", help="Remove every entry")
+    clear_p.add_argument("--namespace", default=None, help="Only clear one namespace")
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        stats = artifact_cache.stats()
+        print(f"Cache root: {artifact_cache.root}")
+        for ns, (count, total) in sorted(stats.items()):
+            print(f"  {ns:<10} {count:>6} entries  {total / 1024 / 1024:>9.1f} MB")
+        grand = sum(total for _, total in stats.values())
+        print(f"  {'total':<10} {sum(c for c, _ in stats.values()):>6} entries  {grand / 1024 / 1024:>9.1f} MB"
+              f"  (limit {artifact_cache.max_bytes / 1024 / 1024:.0f} MB)")
+    elif args.command == "prune":
+        max_bytes = None if args.max_mb is None else int(args.max_mb * 1024 * 1024)
+        removed, freed = artifact_cache.prune(max_bytes, args.namespace)
+        print(f"Removed {removed} entries, freed {freed / 1024 / 1024:.1f} MB")
+    elif args.command == "clear":
+        removed, freed = artifact_cache.prune(0, args.namespace)
+        print(f"Removed {removed} entries, freed {freed / 1024 / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
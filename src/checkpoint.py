@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta
+from functools import cached_property
+from pathlib import Path
+from src.config_loader import config
+from src.logger import logger
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class StoryCheckpoint:
+    """
+    Progress manifest for one story, stored at state/stories/<story_id>.json.
+
+    Each finished stage records its artifacts (path + sha256) and any data the
+    next stage needs. A stage only counts as done while all of its artifacts
+    still exist with the recorded checksum.
+    """
+
+    def __init__(self, path, data):
+        self.path = Path(path)
+        self.data = data
+
+    @property
+    def story_id(self):
+        return self.data["story_id"]
+
+    @property
+    def topic(self):
+        return self.data["topic"]
+
+    @property
+    def completed(self):
+        return self.data.get("status") == "COMPLETE"
+
+    @property
+    def failed(self):
+        return self.data.get("status") == "FAILED"
+
+    @property
+    def attempts(self):
+        """Runs that have worked on this story, counting the one that started it."""
+        return self.data.get("attempts", 1)
+
+    @property
+    def queued(self):
+        """Rendered and waiting in the upload queue; nothing left for --resume to do."""
+        return self.data.get("status") == "QUEUED"
+
+    def is_done(self, stage):
+        entry = self.data["stages"].get(stage)
+        if not entry:
+            return False
+        for artifact in entry.get("artifacts", []):
+            path = artifact["path"]
+            if not os.path.exists(path) or file_sha256(path) != artifact["sha256"]:
+                logger.warning(f"[Checkpoint] {self.story_id}: artifact changed or missing for '{stage}': {path}")
+                return False
+        return True
+
+    def get(self, stage):
+        return self.data["stages"].get(stage, {}).get("data", {})
+
+    def mark_done(self, stage, artifacts=(), data=None):
+        self.data["stages"][stage] = {
+            "completed_at": datetime.now().isoformat(),
+            "artifacts": [{"path": str(p), "sha256": file_sha256(p)} for p in artifacts],
+            "data": data or {},
+        }
+        self.save()
+
+    def reopen(self, *stages):
+        """Forgets the given stages and puts the story back in progress, so --resume redoes them."""
+        for stage in stages:
+            self.data["stages"].pop(stage, None)
+        self.data["status"] = "IN_PROGRESS"
+        self.save()
+
+    def mark_queued(self):
+        self.data["status"] = "QUEUED"
+        self.save()
+
+    def mark_failed(self):
+        self.data["status"] = "FAILED"
+        self.save()
+
+    def mark_complete(self):
+        self.data["status"] = "COMPLETE"
+        self.save()
+
+    def save(self):
+        self.data["updated_at"] = datetime.now().isoformat()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename so a crash never leaves a half-written manifest
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=".tmp_")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+
+class CheckpointStore:
+    def __init__(self):
+        self.dir = config.state_dir / "stories"
+
+    @cached_property
+    def max_age_days(self):
+        return int(config.settings.get("CHECKPOINT_MAX_AGE_DAYS", 3))
+
+    @cached_property
+    def max_attempts(self):
+        return int(config.settings.get("CHECKPOINT_MAX_ATTEMPTS", 3))
+
+    def _path(self, story_id):
+        return self.dir / f"{story_id}.json"
+
+    def load(self, story_id):
+        """The existing manifest for story_id, or None."""
+        path = self._path(story_id)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return StoryCheckpoint(path, json.load(f))
+        except (OSError, ValueError):
+            return None
+
+    def start(self, story_id, topic, resume=False):
+        """
+        Returns the manifest for story_id. With resume=True an existing manifest
+        is kept and its attempt count goes up; otherwise the story starts over
+        from the first stage.
+        """
+        path = self._path(story_id)
+        if resume and path.exists():
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    checkpoint = StoryCheckpoint(path, json.load(f))
+                checkpoint.data["attempts"] = checkpoint.attempts + 1
+                checkpoint.save()
+                return checkpoint
+            except (OSError, ValueError) as e:
+                logger.warning(f"[Checkpoint] Unreadable manifest {path}, starting over: {e}")
+
+        checkpoint = StoryCheckpoint(path, {
+            "story_id": story_id,
+            "topic": topic,
+            "status": "IN_PROGRESS",
+            "attempts": 1,
+            "created_at": datetime.now().isoformat(),
+            "stages": {},
+        })
+        checkpoint.save()
+        return checkpoint
+
+    def pending(self):
+        """Unfinished manifests, oldest first. Manifests older than CHECKPOINT_MAX_AGE_DAYS are deleted."""
+        if not self.dir.exists():
+            return []
+
+        cutoff = datetime.now() - timedelta(days=self.max_age_days)
+        found = []
+        for path in sorted(self.dir.glob("*.json")):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    checkpoint = StoryCheckpoint(path, json.load(f))
+            except (OSError, ValueError):
+                continue
+            if datetime.fromisoformat(checkpoint.data["created_at"]) < cutoff:
+                if not (checkpoint.completed or checkpoint.queued or checkpoint.failed):
+                    logger.info(f"[Checkpoint] Dropping stale manifest {checkpoint.story_id}")
+                path.unlink(missing_ok=True)
+                continue
+            if checkpoint.completed or checkpoint.queued or checkpoint.failed:
+                continue
+            found.append(checkpoint)
+
+        found.sort(key=lambda c: c.data["created_at"])
+        return found
+
+
+checkpoint_store = CheckpointStore()
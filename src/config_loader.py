@@ -1,36 +1,73 @@
 import os
-import yaml
 import json
-from dotenv import load_dotenv
+import threading
+from functools import cached_property
 from pathlib import Path
 from src.logger import logger
 
-# Load .env if exists (local dev)
-load_dotenv()
 
 class Config:
+    """
+    Paths are fixed at import; settings.yaml and .env are only read on first
+    use, so importing a module (or running --help) does not pay for them.
+    Nothing is created here: state/ and outputs/ are made by whatever first
+    writes into them.
+    """
+
     def __init__(self):
         self.root_dir = Path(__file__).resolve().parent.parent
         self.config_dir = self.root_dir / "config"
         self.assets_dir = self.root_dir / "assets"
         self.state_dir = self.root_dir / "state"
         self.output_dir = self.root_dir / "outputs"
-        
-        # Ensure directories
-        self.state_dir.mkdir(exist_ok=True)
-        self.output_dir.mkdir(exist_ok=True)
-        
-        # Load settings
-        self.settings = self._load_settings()
-        
-        # Secrets (Env vars take precedence over settings.yaml)
-        self.gemini_api_key = os.getenv("GEMINI_API_KEY") or self.settings.get("GEMINI_API_KEY")
-        self.elevenlabs_api_key = os.getenv("ELEVENLABS_API_KEY") or self.settings.get("ELEVENLABS_API_KEY")
-        self.youtube_client_id = os.getenv("YOUTUBE_CLIENT_ID") or self.settings.get("YOUTUBE_CLIENT_ID")
-        self.youtube_client_secret = os.getenv("YOUTUBE_CLIENT_SECRET") or self.settings.get("YOUTUBE_CLIENT_SECRET")
-        self.youtube_refresh_token = os.getenv("YOUTUBE_REFRESH_TOKEN") or self.settings.get("YOUTUBE_REFRESH_TOKEN")
-        self.telegram_bot_token = os.getenv("TELEGRAM_BOT_TOKEN") or self.settings.get("TELEGRAM_BOT_TOKEN")
-        self.telegram_chat_id = os.getenv("TELEGRAM_CHAT_ID") or self.settings.get("TELEGRAM_CHAT_ID")
+
+        self._env_lock = threading.Lock()
+        self._env_loaded = False
+
+    def getenv(self, name, default=None):
+        """os.getenv, after loading .env if it exists (local dev)."""
+        with self._env_lock:
+            if not self._env_loaded:
+                from dotenv import load_dotenv
+                load_dotenv()
+                self._env_loaded = True
+        return os.getenv(name, default)
+
+    @cached_property
+    def settings(self):
+        return self._load_settings()
+
+    # Secrets (Env vars take precedence over settings.yaml)
+    def _secret(self, name):
+        return self.getenv(name) or self.settings.get(name)
+
+    @property
+    def gemini_api_key(self):
+        return self._secret("GEMINI_API_KEY")
+
+    @property
+    def elevenlabs_api_key(self):
+        return self._secret("ELEVENLABS_API_KEY")
+
+    @property
+    def youtube_client_id(self):
+        return self._secret("YOUTUBE_CLIENT_ID")
+
+    @property
+    def youtube_client_secret(self):
+        return self._secret("YOUTUBE_CLIENT_SECRET")
+
+    @property
+    def youtube_refresh_token(self):
+        return self._secret("YOUTUBE_REFRESH_TOKEN")
+
+    @property
+    def telegram_bot_token(self):
+        return self._secret("TELEGRAM_BOT_TOKEN")
+
+    @property
+    def telegram_chat_id(self):
+        return self._secret("TELEGRAM_CHAT_ID")
 
     def _load_settings(self):
         settings_path = self.config_dir / "settings.yaml"
@@ -40,6 +77,7 @@ class Config:
             settings_path = self.config_dir / "settings.yaml.example"
             
         try:
+            import yaml
             with open(settings_path, 'r', encoding='utf-8') as f:
                 return yaml.safe_load(f) or {}
         except Exception as e:
@@ -1,48 +1,287 @@
-import requests
+import base64
+import os
+import re
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+from pathlib import Path
 from src.config_loader import config
 from src.logger import logger
+from src.cache import artifact_cache
+from src.http_client import http_client
+from src.tracing import tracer
+from src.mp3_duration import Mp3DurationParser, mp3_duration
+
+# Break after sentence ends (Devanagari danda or Latin punctuation) and after [pause] tags.
+# The tag stays with the text before it, so the model still renders the pause.
+SENTENCE_BREAK = re.compile(r"(?<=[।॥.!?])\s+(?!\[pause\])|(?<=\[pause\])\s*")
+
+
+def split_narration(text, max_chars):
+    """
+    Splits narration into chunks of whole sentences of at most max_chars each
+    (a longer single sentence becomes its own chunk). max_chars 0 gives one
+    chunk per sentence.
+    """
+    chunks = []
+    current = ""
+    for sentence in (part.strip() for part in SENTENCE_BREAK.split(text)):
+        if not sentence:
+            continue
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def sentence_segments(alignment):
+    """
+    Per-sentence {"text", "start", "duration"} from an ElevenLabs character
+    alignment (characters with start/end times).
+    """
+    chars = alignment.get("characters") or []
+    starts = alignment.get("character_start_times_seconds") or []
+    ends = alignment.get("character_end_times_seconds") or []
+    text = "".join(chars)
+    if not text or len(chars) != len(starts) or len(chars) != len(ends):
+        return []
+
+    segments = []
+    offset = 0
+    # Character offsets equal list indexes because every entry is one character
+    for match in list(SENTENCE_BREAK.finditer(text)) + [None]:
+        span_end = match.start() if match else len(text)
+        sentence = text[offset:span_end]
+        if sentence.strip():
+            first = offset + (len(sentence) - len(sentence.lstrip()))
+            last = offset + len(sentence.rstrip()) - 1
+            segments.append({
+                "text": sentence.strip(),
+                "start": round(starts[first], 3),
+                "duration": round(ends[last] - starts[first], 3),
+            })
+        offset = match.end() if match else len(text)
+
+    # Make the segments contiguous: each sentence runs until the next one starts
+    for current, following in zip(segments, segments[1:]):
+        current["duration"] = round(following["start"] - current["start"], 3)
+    return segments
+
 
 class VoiceGenerator:
     def __init__(self):
-        self.api_key = config.elevenlabs_api_key
-        self.voice_id = config.settings.get("ELEVENLABS_VOICE_ID", "q7fnW6ILZEHm4u3pf2g0")
-        self.model_id = config.settings.get("ELEVENLABS_MODEL_ID", "eleven_multilingual_v3")
+        self.voice_settings = {
+            "stability": 0.35,       # Lower = more emotional variation, less robotic flatness
+            "similarity_boost": 0.80, # Higher = stays true to the voice character
+            "style": 0.75,           # Higher = more expressive, dramatic delivery
+            "use_speaker_boost": True # Adds presence and warmth to the voice
+        }
 
-    def generate_audio(self, text, output_path):
-        url = f"https://api.elevenlabs.io/v1/text-to-speech/{self.voice_id}"
-        
-        headers = {
+    # The key and settings are read on the first narration, not at import
+    @cached_property
+    def api_key(self):
+        return config.elevenlabs_api_key
+
+    @cached_property
+    def voice_id(self):
+        return config.settings.get("ELEVENLABS_VOICE_ID", "q7fnW6ILZEHm4u3pf2g0")
+
+    @cached_property
+    def model_id(self):
+        return config.settings.get("ELEVENLABS_MODEL_ID", "eleven_multilingual_v3")
+
+    # Chunked mode: sentence groups generated concurrently and joined locally
+    @cached_property
+    def chunked(self):
+        return bool(config.settings.get("VOICE_CHUNKED", False))
+
+    @cached_property
+    def chunk_chars(self):
+        return int(config.settings.get("VOICE_CHUNK_CHARS", 300))
+
+    @cached_property
+    def chunk_workers(self):
+        return max(1, int(config.settings.get("VOICE_CHUNK_WORKERS", 3)))
+
+    # Single requests go to /with-timestamps, giving sentence timings for scene alignment
+    @cached_property
+    def timestamps(self):
+        return bool(config.settings.get("VOICE_TIMESTAMPS", False))
+
+    # Long narrations stream for longer than HTTP_READ_TIMEOUT allows
+    @cached_property
+    def timeout(self):
+        return (http_client.connect_timeout, float(config.settings.get("ELEVENLABS_READ_TIMEOUT", 180)))
+
+    def _headers(self):
+        return {
             "Accept": "audio/mpeg",
             "Content-Type": "application/json",
             "xi-api-key": self.api_key
         }
-        
+
+    def _cache_key(self, text):
+        return artifact_cache.make_key(text, self.voice_id, self.model_id, self.voice_settings)
+
+    def _request_audio(self, url, text, output_path):
+        """
+        Streams one TTS response into output_path.
+        Returns the duration in seconds (None if unreadable), or False on failure.
+        """
         data = {
             "text": text,
             "model_id": self.model_id,
-            "voice_settings": {
-                "stability": 0.35,       # Lower = more emotional variation, less robotic flatness
-                "similarity_boost": 0.80, # Higher = stays true to the voice character
-                "style": 0.75,           # Higher = more expressive, dramatic delivery
-                "use_speaker_boost": True # Adds presence and warmth to the voice
-            }
+            "voice_settings": self.voice_settings
         }
-        
-        logger.info(f"Generating voice for text length: {len(text)}")
         try:
-            response = requests.post(url, json=data, headers=headers)
-            if response.status_code == 200:
-                with open(output_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=1024):
-                        if chunk:
-                            f.write(chunk)
-                logger.info(f"Audio saved to {output_path}")
-                return True
-            else:
-                logger.error(f"ElevenLabs Error: {response.text}")
-                return False
+            # Streamed so the file (and its duration) is written as bytes arrive
+            with http_client.post(url, json=data, headers=self._headers(), stream=True, timeout=self.timeout) as response:
+                if response.status_code == 200:
+                    # Frame headers are parsed as the bytes arrive, so the duration is
+                    # known once the last chunk is written
+                    parser = Mp3DurationParser()
+                    with open(output_path, 'wb') as f:
+                        for chunk in response.iter_content(chunk_size=1024):
+                            if chunk:
+                                f.write(chunk)
+                                parser.feed(chunk)
+                    tracer.add(bytes=os.path.getsize(output_path), billed_chars=len(text))
+                    logger.info(f"Audio saved to {output_path} ({parser.duration or 0:.2f}s)")
+                    artifact_cache.put_file("audio", self._cache_key(text), output_path)
+                    return parser.duration
+                else:
+                    logger.error(f"ElevenLabs Error: {response.text}")
+                    return False
         except Exception as e:
             logger.error(f"Voice generation exception: {e}")
             return False
 
+    def generate_audio(self, text, output_path):
+        """
+        Saves the narration MP3 to output_path.
+        Returns {"path", "duration", "segments"}, or None on failure. duration is
+        in seconds (None if it could not be read from the stream); segments lists
+        {"text", "start", "duration"} per generated chunk (one for the whole
+        narration unless VOICE_CHUNKED is on).
+        """
+        if self.chunked:
+            chunks = split_narration(text, self.chunk_chars)
+            if len(chunks) > 1:
+                return self._generate_chunked(chunks, output_path)
+
+        if self.timestamps:
+            return self._generate_with_timestamps(text, output_path)
+
+        url = f"https://api.elevenlabs.io/v1/text-to-speech/{self.voice_id}"
+
+        if artifact_cache.get_file("audio", self._cache_key(text), output_path):
+            duration = mp3_duration(output_path)
+        else:
+            logger.info(f"Generating voice for text length: {len(text)}")
+            duration = self._request_audio(url, text, output_path)
+            if duration is False:
+                return None
+        segments = [{"text": text, "start": 0.0, "duration": duration}] if duration else []
+        return {"path": str(output_path), "duration": duration, "segments": segments}
+
+    def _generate_with_timestamps(self, text, output_path):
+        cache_key = self._cache_key(text)
+        # The alignment is cached next to the audio under its own key
+        segments_key = artifact_cache.make_key(cache_key, "timestamps")
+        segments = artifact_cache.get_json("audio", segments_key)
+        if segments is not None and artifact_cache.get_file("audio", cache_key, output_path):
+            return {"path": str(output_path), "duration": mp3_duration(output_path), "segments": segments}
+
+        url = f"https://api.elevenlabs.io/v1/text-to-speech/{self.voice_id}/with-timestamps"
+        data = {
+            "text": text,
+            "model_id": self.model_id,
+            "voice_settings": self.voice_settings
+        }
+        logger.info(f"Generating voice with timestamps for text length: {len(text)}")
+        try:
+            response = http_client.post(
+                url, json=data, headers=dict(self._headers(), Accept="application/json"), timeout=self.timeout
+            )
+            if response.status_code != 200:
+                logger.error(f"ElevenLabs Error: {response.text}")
+                return None
+            payload = response.json()
+            audio = base64.b64decode(payload["audio_base64"])
+        except Exception as e:
+            logger.error(f"Voice generation exception: {e}")
+            return None
+
+        with open(output_path, 'wb') as f:
+            f.write(audio)
+        tracer.add(bytes=len(audio), billed_chars=len(text))
+        parser = Mp3DurationParser()
+        parser.feed(audio)
+        segments = sentence_segments(payload.get("alignment") or {})
+        if segments and parser.duration:
+            segments[-1]["duration"] = round(parser.duration - segments[-1]["start"], 3)
+
+        logger.info(f"Audio saved to {output_path} ({parser.duration or 0:.2f}s, {len(segments)} sentences)")
+        artifact_cache.put_file("audio", cache_key, output_path)
+        artifact_cache.put_json("audio", segments_key, segments)
+        return {"path": str(output_path), "duration": parser.duration, "segments": segments}
+
+    def _generate_chunk(self, text, chunk_path):
+        """Duration of the chunk written to chunk_path (None if unreadable), or False on failure."""
+        if artifact_cache.get_file("audio", self._cache_key(text), chunk_path):
+            return mp3_duration(chunk_path)
+
+        url = f"https://api.elevenlabs.io/v1/text-to-speech/{self.voice_id}/stream"
+        for attempt in range(1, 3):
+            duration = self._request_audio(url, text, chunk_path)
+            if duration is not False:
+                # Written and cached: an unreadable stream duration is no reason to pay again
+                return duration or mp3_duration(chunk_path)
+            logger.warning(f"Narration chunk failed (attempt {attempt}/2): {text[:40]}")
+            tracer.add(retries=1)
+        return False
+
+    def _generate_chunked(self, chunks, output_path):
+        """
+        Generates the chunks concurrently (each one cached on its own, so a failed
+        chunk is the only one requested again) and joins them with a stream copy.
+        """
+        output_path = Path(output_path)
+        chunk_paths = [output_path.with_name(f"{output_path.stem}_chunk_{i}.mp3") for i in range(len(chunks))]
+        logger.info(f"Generating voice in {len(chunks)} chunks ({self.chunk_workers} at a time)")
+
+        with ThreadPoolExecutor(max_workers=self.chunk_workers) as pool:
+            durations = list(pool.map(tracer.wrap(self._generate_chunk, "audio_chunk"), chunks, chunk_paths))
+        if any(duration is False for duration in durations):
+            logger.error("Narration chunk generation failed")
+            return None
+
+        list_path = output_path.with_name(f"{output_path.stem}_chunks.txt")
+        with open(list_path, "w", encoding="utf-8") as f:
+            for chunk_path in chunk_paths:
+                escaped = str(chunk_path.resolve()).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        cmd = ["ffmpeg", "-y", "-hide_banner", "-f", "concat", "-safe", "0", "-i", str(list_path),
+               "-c", "copy", str(output_path)]
+        try:
+            subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except subprocess.CalledProcessError as e:
+            logger.error(f"FFmpeg narration concat failed: {e.stderr.decode()}")
+            return None
+
+        # Chunk timings are only usable if every chunk's duration could be read
+        segments = []
+        start = 0.0
+        if None not in durations:
+            for chunk_text, duration in zip(chunks, durations):
+                segments.append({"text": chunk_text, "start": round(start, 3), "duration": round(duration, 3)})
+                start += duration
+        duration = mp3_duration(output_path) or start or None
+        logger.info(f"Audio saved to {output_path} ({duration or 0:.2f}s from {len(chunks)} chunks)")
+        return {"path": str(output_path), "duration": duration, "segments": segments}
+
 voice_generator = VoiceGenerator()
@@ -0,0 +1,139 @@
+import os
+import subprocess
+import threading
+import time
+from collections import deque
+from functools import cached_property
+from src.config_loader import config
+from src.logger import logger
+from src.tracing import tracer
+
+
+class FFmpegError(RuntimeError):
+    """An FFmpeg run failed or timed out; the message ends with the tail of its stderr."""
+
+    def __init__(self, message, returncode=None, stderr_tail=""):
+        super().__init__(f"{message}\n{stderr_tail}" if stderr_tail else message)
+        self.returncode = returncode
+        self.stderr_tail = stderr_tail
+
+
+class FFmpegRunner:
+    """
+    Runs FFmpeg with -progress on stdout and reads it while the encode runs.
+
+    Progress (frame, fps, speed, out_time) is logged every
+    FFMPEG_PROGRESS_INTERVAL_SEC. Only the last FFMPEG_STDERR_LINES lines of
+    stderr are kept for error messages. A watchdog kills the encode after
+    FFMPEG_TIMEOUT_SEC. The child is reaped with os.wait4, so every run reports
+    its own peak RSS and CPU time even when several encodes run at once.
+    """
+
+    @cached_property
+    def progress_interval(self):
+        return float(config.settings.get("FFMPEG_PROGRESS_INTERVAL_SEC", 10))
+
+    @cached_property
+    def timeout(self):
+        return float(config.settings.get("FFMPEG_TIMEOUT_SEC", 1800))  # 0 = no limit
+
+    @cached_property
+    def stderr_lines(self):
+        return int(config.settings.get("FFMPEG_STDERR_LINES", 40))
+
+    def run(self, cmd, label="ffmpeg", expected_sec=None):
+        """
+        Runs cmd (an argv list starting with "ffmpeg") to completion.
+        Returns stats: frame, fps, speed, out_time_sec, wall, cpu, peak_rss_mb.
+        Raises FFmpegError on a non-zero exit or timeout.
+        """
+        argv = [cmd[0], "-nostats", "-progress", "pipe:1"] + list(cmd[1:])
+        start = time.perf_counter()
+        proc = subprocess.Popen(
+            argv, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            text=True, errors="replace"
+        )
+
+        stderr_tail = deque(maxlen=self.stderr_lines)
+        stderr_reader = threading.Thread(target=lambda: stderr_tail.extend(proc.stderr), daemon=True)
+        stderr_reader.start()
+
+        timed_out = threading.Event()
+
+        def kill():
+            timed_out.set()
+            proc.kill()
+        watchdog = threading.Timer(self.timeout, kill) if self.timeout > 0 else None
+        if watchdog:
+            watchdog.daemon = True
+            watchdog.start()
+
+        stats = {"frame": 0, "fps": 0.0, "speed": None, "out_time_sec": 0.0}
+        try:
+            self._read_progress(proc.stdout, stats, label, expected_sec, start)
+        except BaseException:
+            proc.kill()
+            raise
+        finally:
+            returncode, rusage = self._reap(proc)
+            if watchdog:
+                watchdog.cancel()
+            stderr_reader.join(timeout=5)
+            proc.stdout.close()
+            proc.stderr.close()
+
+        stats["wall"] = round(time.perf_counter() - start, 3)
+        if rusage:
+            stats["cpu"] = round(rusage.ru_utime + rusage.ru_stime, 3)
+            stats["peak_rss_mb"] = round(rusage.ru_maxrss / 1024, 1)  # ru_maxrss is in KiB on Linux
+        tracer.add(child_cpu=stats.get("cpu", 0.0), ffmpeg_peak_rss_mb=stats.get("peak_rss_mb"), ffmpeg_speed=stats["speed"])
+
+        tail = "".join(stderr_tail).rstrip()
+        if timed_out.is_set():
+            raise FFmpegError(f"{label} timed out after {self.timeout:.0f}s", returncode, tail)
+        if returncode != 0:
+            raise FFmpegError(f"{label} exited with code {returncode}", returncode, tail)
+
+        logger.info(
+            f"{label} done: {stats['frame']} frames in {stats['wall']:.1f}s "
+            f"(speed {stats['speed'] or '?'}x, cpu {stats.get('cpu', '?')}s, peak RSS {stats.get('peak_rss_mb', '?')} MB)"
+        )
+        return stats
+
+    def _read_progress(self, stream, stats, label, expected_sec, start):
+        last_log = start
+        for line in stream:
+            key, _, value = line.strip().partition("=")
+            if key == "frame":
+                stats["frame"] = int(value or 0)
+            elif key == "fps":
+                stats["fps"] = float(value or 0)
+            elif key == "speed":
+                try:
+                    stats["speed"] = float(value.rstrip("x"))
+                except ValueError:
+                    stats["speed"] = None  # "N/A" before the first frame
+            elif key in ("out_time_us", "out_time_ms"):
+                # Both keys are in microseconds
+                if value.lstrip("-").isdigit():
+                    stats["out_time_sec"] = max(0.0, int(value) / 1e6)
+            elif key == "progress":
+                now = time.perf_counter()
+                if value == "continue" and now - last_log >= self.progress_interval:
+                    last_log = now
+                    done = f"{stats['out_time_sec']:.1f}s"
+                    if expected_sec:
+                        done += f"/{expected_sec:.1f}s ({100 * stats['out_time_sec'] / expected_sec:.0f}%)"
+                    logger.info(f"{label}: {done}, frame {stats['frame']}, {stats['fps']:.1f} fps, speed {stats['speed'] or '?'}x")
+
+    def _reap(self, proc):
+        """Waits for the child; returns (returncode, rusage or None)."""
+        if not hasattr(os, "wait4"):
+            return proc.wait(), None
+        _, status, rusage = os.wait4(proc.pid, 0)
+        # Tell Popen the child is gone so it does not try to wait for it again
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        return proc.returncode, rusage
+
+
+ffmpeg_runner = FFmpegRunner()
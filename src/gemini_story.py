@@ -1,63 +1,352 @@
+import hashlib
 import json
+import re
+import threading
 import time
-from pydantic import BaseModel
-from google import genai
+from datetime import datetime, timedelta, timezone
+from functools import cached_property, lru_cache
 from src.config_loader import config
 from src.logger import logger
-from tenacity import retry, stop_after_attempt, wait_fixed
+from src.cache import artifact_cache
+from src.rate_limiter import RateLimiter
+from src.tracing import tracer
+
+# "retryDelay: '24s'" (REST/JSON errors) or "retry_delay { seconds: 24 }" (gRPC errors)
+RETRY_DELAY_PATTERNS = (
+    re.compile(r"retryDelay['\"]?\s*:\s*['\"]?(\d+(?:\.\d+)?)s"),
+    re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)"),
+)
+
+
+def parse_retry_delay(error):
+    """Seconds the API asked us to wait before retrying, or None."""
+    text = f"{error} {getattr(error, 'details', '')}"
+    for pattern in RETRY_DELAY_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            return float(match.group(1))
+    return None
+
+
+def is_quota_error(error):
+    return getattr(error, "code", None) == 429 or any(
+        marker in str(error) for marker in ("RESOURCE_EXHAUSTED", "ResourceExhausted")
+    )
+
 
 # 1. Define Pydantic Models (Better for JSON enforcement)
-class Scene(BaseModel):
-    duration_sec: float
-    visual_prompt: str
-    on_screen_text: str
-    sfx: list[str]
-
-class StorySchema(BaseModel):
-    series: str
-    language: str
-    story_id: str
-    topic_id: str
-    title: str
-    mood: str
-    narration_text: str
-    scenes: list[Scene]
-    hashtags: list[str]
+# Built on the first request: pydantic takes longer to import than the rest of the pipeline
+@lru_cache(maxsize=None)
+def story_schema():
+    from pydantic import BaseModel
+
+    class Scene(BaseModel):
+        duration_sec: float
+        visual_prompt: str
+        on_screen_text: str
+        sfx: list[str]
+
+    class StorySchema(BaseModel):
+        series: str
+        language: str
+        story_id: str
+        topic_id: str
+        title: str
+        mood: str
+        narration_text: str
+        scenes: list[Scene]
+        hashtags: list[str]
+
+    return StorySchema
+
+class SystemPromptCache:
+    """
+    Keeps the system prompt in Gemini's cached-content store, so story requests
+    reference it by name instead of resending it.
+
+    The cache is looked up by display name (a hash of model and prompt), and an
+    unexpired one left by an earlier run is reused. If caching is unavailable
+    (free tier, prompt below the minimum size, API error) get() returns None
+    for the rest of the run and callers send system_instruction as before.
+    Only client.caches.list/create are used, so any object offering those
+    can stand in for the SDK client.
+    """
+
+    # Do not hand out a cache that could expire while a request is in flight
+    EXPIRY_MARGIN = timedelta(minutes=5)
+
+    def __init__(self, client, model_id, system_prompt, ttl_sec=3600):
+        self.client = client
+        self.model_id = model_id
+        self.system_prompt = system_prompt
+        self.ttl_sec = int(ttl_sec)
+        digest = hashlib.sha256(f"{model_id}\n{system_prompt}".encode("utf-8")).hexdigest()[:16]
+        self.display_name = f"youtubestory-prompt-{digest}"
+
+        self._lock = threading.Lock()
+        self._name = None
+        self._expires = None
+        self._disabled = False
+
+    def get(self):
+        """Name of a live cached context for the prompt, or None."""
+        with self._lock:
+            if self._disabled:
+                return None
+            now = datetime.now(timezone.utc)
+            if self._name and self._expires and self._expires - self.EXPIRY_MARGIN > now:
+                return self._name
+            try:
+                self._name, self._expires = self._find(now) or self._create()
+            except Exception as e:
+                self._disable(f"could not create cached context: {e}")
+                return None
+            return self._name
+
+    def disable(self, reason):
+        with self._lock:
+            self._disable(reason)
+
+    def _disable(self, reason):
+        if not self._disabled:
+            logger.warning(f"Gemini context caching off for this run ({reason}), sending system prompt inline")
+        self._disabled = True
+        self._name = None
+
+    def _find(self, now):
+        for cached in self.client.caches.list():
+            if cached.display_name != self.display_name or not (cached.model or "").endswith(self.model_id):
+                continue
+            if cached.expire_time and cached.expire_time - self.EXPIRY_MARGIN > now:
+                logger.info(f"Reusing Gemini cached context {cached.name} (expires {cached.expire_time:%H:%M} UTC)")
+                return cached.name, cached.expire_time
+        return None
+
+    def _create(self):
+        cached = self.client.caches.create(
+            model=self.model_id,
+            config={
+                'display_name': self.display_name,
+                'system_instruction': self.system_prompt,
+                'ttl': f"{self.ttl_sec}s",
+            }
+        )
+        expires = cached.expire_time or datetime.now(timezone.utc) + timedelta(seconds=self.ttl_sec)
+        logger.info(f"Created Gemini cached context {cached.name} for the system prompt")
+        return cached.name, expires
+
+
+def is_cache_error(error):
+    return getattr(error, "code", None) in (400, 403, 404) and "cache" in str(error).lower()
+
 
 class GeminiStoryGenerator:
-    def __init__(self):
-        # Use the modern Client
-        self.client = genai.Client(api_key=config.gemini_api_key)
+    """
+    The Gemini client, the system prompt, its context cache and the settings
+    are set up on first use, so importing this module does not load the
+    google-genai SDK or settings.yaml.
+    """
+
+    def __init__(self, client=None):
+        # A fake with the same surface as genai.Client can be passed in
+        self._client = client
+        self._system_prompt = None
+        self._prompt_cache = None
+        self._rate_limiter = None
+        self._init_lock = threading.Lock()
         # Corrected Model: gemini-2.0-flash or gemini-1.5-flash
         self.model_id = "gemini-2.5-flash" 
-        self.system_prompt = config.get_gemini_prompt()
+        self.max_attempts = 2
+        self._prefetched = {}
 
-    @retry(stop=stop_after_attempt(2), wait=wait_fixed(5))
-    def generate_story(self, topic):
+    @property
+    def rate_limiter(self):
+        # Shared by every story thread, so created once under the lock
+        with self._init_lock:
+            if self._rate_limiter is None:
+                self._rate_limiter = RateLimiter(
+                    rpm=int(config.settings.get("GEMINI_RPM", 10)),
+                    tpm=int(config.settings.get("GEMINI_TPM", 250000)),
+                )
+            return self._rate_limiter
+
+    # Output tokens reserved per request until the real usage is known
+    @cached_property
+    def output_token_estimate(self):
+        return int(config.settings.get("GEMINI_OUTPUT_TOKENS_ESTIMATE", 2000))
+
+    @cached_property
+    def max_quota_waits(self):
+        return int(config.settings.get("GEMINI_MAX_QUOTA_WAITS", 5))
+
+    # Longer delays mean a daily quota is gone; waiting would only stall the run
+    @cached_property
+    def max_retry_delay(self):
+        return float(config.settings.get("GEMINI_MAX_RETRY_DELAY", 120))
+
+    # Stories per request in prefetch(); 1 keeps one request per story
+    @cached_property
+    def batch_size(self):
+        return max(1, int(config.settings.get("GEMINI_BATCH_SIZE", 3)))
+
+    # The response schema cannot be part of a cached context, only the prompt
+    @cached_property
+    def context_cache(self):
+        return bool(config.settings.get("GEMINI_CONTEXT_CACHE", False))
+
+    @cached_property
+    def context_cache_ttl(self):
+        return config.settings.get("GEMINI_CONTEXT_CACHE_TTL_SEC", 3600)
+
+    @property
+    def client(self):
+        with self._init_lock:
+            if self._client is None:
+                # Use the modern Client
+                from google import genai
+                self._client = genai.Client(api_key=config.gemini_api_key)
+            return self._client
+
+    @property
+    def system_prompt(self):
+        if self._system_prompt is None:
+            self._system_prompt = config.get_gemini_prompt()
+        return self._system_prompt
+
+    @property
+    def prompt_cache(self):
+        if self.context_cache and self._prompt_cache is None:
+            client = self.client
+            with self._init_lock:
+                if self._prompt_cache is None:
+                    self._prompt_cache = SystemPromptCache(
+                        client, self.model_id, self.system_prompt, ttl_sec=self.context_cache_ttl
+                    )
+        return self._prompt_cache
+
+    def _user_prompt(self, topic, current_date):
         topic_id = topic.get('id', 'unknown')
-        current_date = time.strftime("%Y-%m-%d")
-        
-        user_prompt = f"""
+        return f"""
         Topic JSON: {json.dumps(topic, ensure_ascii=False)}
         Generate a story regarding this topic.
         Make sure the story_id follows format: {current_date}_{topic_id}.
         Current Date: {current_date}
         """
 
+    def _cache_key(self, topic, user_prompt):
+        # Same topic + prompt + model → reuse the script we already generated
+        return artifact_cache.make_key(topic, self.system_prompt, user_prompt, self.model_id)
+
+    def generate_story(self, topic):
+        topic_id = topic.get('id', 'unknown')
+        current_date = time.strftime("%Y-%m-%d")
+        user_prompt = self._user_prompt(topic, current_date)
+        cache_key = self._cache_key(topic, user_prompt)
+
+        prefetched = self._prefetched.pop(cache_key, None)
+        if prefetched:
+            logger.info(f"Using prefetched story for topic: {topic_id}")
+            return prefetched
+
+        cached = artifact_cache.get_json("stories", cache_key)
+        if cached:
+            logger.info(f"Using cached story for topic: {topic_id}")
+            return cached
+
         logger.info(f"Generating story for topic: {topic_id}")
-        
+        story_json = self._request_story(user_prompt)
+        artifact_cache.put_json("stories", cache_key, story_json)
+        return story_json
+
+    def prefetch(self, topics):
+        """
+        Generates the stories for many topics in calls of GEMINI_BATCH_SIZE, so
+        the generate_story() calls that follow return without a request each.
+
+        Every item of a batch is validated on its own and only the invalid ones
+        are asked for again. Topics still missing after max_attempts are left to
+        generate_story(), which requests them one by one as before.
+        """
+        current_date = time.strftime("%Y-%m-%d")
+        pending = []
+        for topic in topics:
+            cache_key = self._cache_key(topic, self._user_prompt(topic, current_date))
+            if cache_key not in self._prefetched and not artifact_cache.get_json("stories", cache_key):
+                pending.append((topic, cache_key))
+
+        for attempt in range(1, self.max_attempts + 1):
+            if not pending:
+                break
+            failed = []
+            for i in range(0, len(pending), self.batch_size):
+                batch = pending[i:i + self.batch_size]
+                logger.info(f"Generating {len(batch)} stories in one request (attempt {attempt}/{self.max_attempts})")
+                try:
+                    items = self._request_batch([topic for topic, _ in batch], current_date)
+                except Exception as e:
+                    logger.error(f"Gemini batch generation failed: {e}")
+                    failed.extend(batch)
+                    continue
+
+                batch_ids = {str(topic.get('id', 'unknown')) for topic, _ in batch}
+                for idx, (topic, cache_key) in enumerate(batch):
+                    story_json = self._pick_batch_item(items, topic, idx, batch_ids)
+                    if story_json is None:
+                        failed.append((topic, cache_key))
+                        continue
+                    self._prefetched[cache_key] = story_json
+                    artifact_cache.put_json("stories", cache_key, story_json)
+            pending = failed
+
+        if pending:
+            logger.warning(f"Batch generation left {len(pending)} topic(s) for single requests")
+
+    def _pick_batch_item(self, items, topic, idx, batch_ids=()):
+        """
+        The validated story for topic from a batch response, or None. Items are
+        matched by topic_id; the item at the topic's position is only used when
+        no topic of the batch (batch_ids) claims it by id.
+        """
+        topic_id = str(topic.get('id', 'unknown'))
+        by_id = [item for item in items if isinstance(item, dict) and str(item.get("topic_id")) == topic_id]
+        item = by_id[0] if by_id else None
+        if item is None and len(items) > idx:
+            claimed_by = items[idx].get("topic_id") if isinstance(items[idx], dict) else None
+            if claimed_by is None or str(claimed_by) not in batch_ids:
+                item = items[idx]
         try:
-            # The new SDK passes system_instruction inside the config
-            response = self.client.models.generate_content(
-                model=self.model_id,
-                contents=user_prompt,
-                config={
-                    'system_instruction': self.system_prompt,
-                    'response_mime_type': 'application/json',
-                    'response_schema': StorySchema, 
-                }
-            )
+            story = story_schema().model_validate(item)
+            if not story.scenes or not story.narration_text.strip():
+                raise ValueError("story has no scenes or narration")
+        except Exception as e:
+            logger.warning(f"Batch item for topic {topic_id} is invalid, will retry: {e}")
+            return None
+        return story.model_dump()
+
+    def _request_batch(self, topics, current_date):
+        user_prompt = f"""
+        Topics JSON: {json.dumps(topics, ensure_ascii=False)}
+        Generate one separate story for each topic, returned as a JSON list in the same order.
+        Each story's topic_id must be its topic's id and its story_id must follow format: {current_date}_<topic id>.
+        Current Date: {current_date}
+        """
+
+        def parse(response):
+            # Parse the raw text, not response.parsed: one bad item must not void the rest
+            items = json.loads(response.text or "null")
+            if not isinstance(items, list):
+                raise ValueError("Batch response is not a JSON list")
+            return items
+
+        # prefetch() retries the topics a batch failed on, so one attempt here
+        return self._generate(user_prompt, list[story_schema()], parse, stories=len(topics), attempts=1)
 
+    def _estimate_tokens(self, user_prompt, stories=1):
+        # ~4 characters per token is close enough for budgeting
+        return (len(self.system_prompt) + len(user_prompt)) // 4 + self.output_token_estimate * stories
+
+    def _request_story(self, user_prompt):
+        def parse(response):
             # response.parsed is already a Pydantic object
             if not response.parsed:
                 raise ValueError("Empty response from Gemini")
@@ -68,8 +357,64 @@ class GeminiStoryGenerator:
             logger.info("Story generated successfully.")
             return story_json
 
-        except Exception as e:
-            logger.error(f"Gemini generation failed: {e}")
-            raise
+        return self._generate(user_prompt, story_schema(), parse)
+
+    def _generate(self, user_prompt, response_schema, parse, stories=1, attempts=None):
+        """
+        Tries up to attempts times (max_attempts by default). Quota rejections
+        (429) wait for the delay the API asks for and go back in the rate
+        limiter queue; they do not use up an attempt.
+        """
+        attempts = attempts or self.max_attempts
+        estimate = self._estimate_tokens(user_prompt, stories)
+        attempt = 0
+        quota_waits = 0
+        while True:
+            waited = self.rate_limiter.acquire(estimate)
+            if waited > 1:
+                logger.info(f"Gemini rate limiter: waited {waited:.1f}s for quota")
+            request_config = {
+                'response_mime_type': 'application/json',
+                'response_schema': response_schema,
+            }
+            cache_name = self.prompt_cache.get() if self.prompt_cache else None
+            if cache_name:
+                request_config['cached_content'] = cache_name
+            else:
+                # The new SDK passes system_instruction inside the config
+                request_config['system_instruction'] = self.system_prompt
+            try:
+                with tracer.span("gemini_request", stories=stories, cached_prompt=bool(cache_name)):
+                    response = self.client.models.generate_content(
+                        model=self.model_id,
+                        contents=user_prompt,
+                        config=request_config
+                    )
+                    usage = getattr(response, "usage_metadata", None)
+                    total_tokens = getattr(usage, "total_token_count", None)
+                    tracer.add(units=total_tokens or 0, bytes=len(getattr(response, "text", None) or ""))
+                self.rate_limiter.record_usage(estimate, total_tokens)
+                return parse(response)
+
+            except Exception as e:
+                tracer.add(retries=1)
+                if cache_name and is_cache_error(e):
+                    # e.g. the cache was deleted or expired early: retry with the inline prompt
+                    self.prompt_cache.disable(str(e))
+                    continue
+
+                if is_quota_error(e):
+                    delay = parse_retry_delay(e) or 60.0
+                    if quota_waits < self.max_quota_waits and delay <= self.max_retry_delay:
+                        quota_waits += 1
+                        logger.warning(f"Gemini quota exhausted, retrying in {delay:.0f}s ({quota_waits}/{self.max_quota_waits})")
+                        self.rate_limiter.backoff(delay)
+                        continue
+
+                attempt += 1
+                logger.error(f"Gemini generation failed (attempt {attempt}/{attempts}): {e}")
+                if attempt >= attempts:
+                    raise
+                time.sleep(5)
 
 gemini_generator = GeminiStoryGenerator()
@@ -0,0 +1,160 @@
+import random
+import time
+import threading
+from email.utils import parsedate_to_datetime
+from functools import cached_property
+from src.config_loader import config
+from src.logger import logger
+from src.tracing import tracer
+
+
+class HttpClient:
+    """
+    One pooled requests.Session shared by every outbound API client.
+
+    Connections are kept alive between calls, so scene images and narration
+    reuse TCP/TLS sessions instead of handshaking per request. The session's
+    pools are thread safe; each host can get its own pool size so concurrent
+    image fetches do not queue behind each other (HTTP_HOST_POOL_SIZES).
+
+    Transient failures (connection errors, timeouts, 429 and 5xx) are retried
+    with exponential backoff and full jitter, and a Retry-After header from
+    the server always wins over the computed delay.
+
+    The session (and requests itself) is set up on the first request, and
+    the settings are read then too.
+    """
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+    # A read timeout on anything else may come after the server did (and billed) the work
+    IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+    def __init__(self):
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @cached_property
+    def connect_timeout(self):
+        return float(config.settings.get("HTTP_CONNECT_TIMEOUT", 10))
+
+    @cached_property
+    def read_timeout(self):
+        return float(config.settings.get("HTTP_READ_TIMEOUT", 60))
+
+    @cached_property
+    def max_retries(self):
+        return int(config.settings.get("HTTP_MAX_RETRIES", 3))
+
+    @cached_property
+    def backoff_base(self):
+        return float(config.settings.get("HTTP_BACKOFF_BASE", 1.0))
+
+    @cached_property
+    def backoff_max(self):
+        return float(config.settings.get("HTTP_BACKOFF_MAX", 30))
+
+    @cached_property
+    def retry_after_max(self):
+        return float(config.settings.get("HTTP_RETRY_AFTER_MAX", 120))
+
+    @cached_property
+    def pool_size(self):
+        return int(config.settings.get("HTTP_POOL_SIZE", 10))
+
+    @cached_property
+    def host_pool_sizes(self):
+        return config.settings.get("HTTP_HOST_POOL_SIZES") or {}
+
+    @property
+    def session(self):
+        with self._session_lock:
+            if self._session is None:
+                import requests
+                session = requests.Session()
+                self._mount(session, "https://", self.pool_size)
+                self._mount(session, "http://", self.pool_size)
+                for host, size in self.host_pool_sizes.items():
+                    # requests picks the longest matching prefix, so this overrides the default
+                    self._mount(session, f"https://{host}", size)
+                self._session = session
+            return self._session
+
+    def _mount(self, session, prefix, size):
+        from requests.adapters import HTTPAdapter
+        size = max(1, int(size))
+        # pool_block: wait for a free connection rather than open throwaway ones
+        session.mount(prefix, HTTPAdapter(pool_connections=size, pool_maxsize=size, pool_block=True))
+
+    def retry_delay(self, attempt, response=None, base=None):
+        """
+        Seconds to wait before retry number `attempt` (1-based): the server's
+        Retry-After if it sent one, otherwise jittered exponential backoff.
+        """
+        retry_after = self._retry_after(response)
+        if retry_after is not None:
+            return min(retry_after, self.retry_after_max)
+        base = self.backoff_base if base is None else base
+        return random.uniform(0, min(self.backoff_max, base * 2 ** (attempt - 1)))
+
+    def _retry_after(self, response):
+        if response is None:
+            return None
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def request(self, method, url, timeout=None, retries=None, retry_timeouts=None, **kwargs):
+        """
+        Sends the request, retrying transient failures up to `retries` times
+        (HTTP_MAX_RETRIES by default). Returns the last response, whatever its
+        status; raises the last exception if no response was ever received.
+        Read timeouts are only retried when retry_timeouts is true, which by
+        default it is for idempotent methods only; a POST is retried after
+        connection errors but not after the server stopped answering.
+        """
+        retries = self.max_retries if retries is None else retries
+        if retry_timeouts is None:
+            retry_timeouts = method.upper() in self.IDEMPOTENT_METHODS
+        timeout = timeout or (self.connect_timeout, self.read_timeout)
+        session = self.session
+        import requests
+
+        for attempt in range(1, retries + 2):
+            response = None
+            try:
+                response = session.request(method, url, timeout=timeout, **kwargs)
+                if response.status_code not in self.RETRY_STATUSES or attempt > retries:
+                    if not kwargs.get("stream"):
+                        tracer.add(bytes=int(response.headers.get("Content-Length") or 0))
+                    return response
+                reason = f"HTTP {response.status_code}"
+            except (requests.ConnectionError, requests.Timeout) as e:
+                # ConnectTimeout is also a ConnectionError: the request never reached the server
+                read_timeout = isinstance(e, requests.Timeout) and not isinstance(e, requests.ConnectionError)
+                if attempt > retries or (read_timeout and not retry_timeouts):
+                    raise
+                reason = str(e)
+
+            wait = self.retry_delay(attempt, response)
+            if response is not None:
+                response.close()
+            logger.warning(f"[HTTP] {method} {url} failed ({reason}), retry {attempt}/{retries} in {wait:.1f}s")
+            tracer.add(retries=1)
+            time.sleep(wait)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+
+http_client = HttpClient()
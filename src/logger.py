@@ -1,9 +1,10 @@
 import logging
+import logging.handlers
 import sys
 import os
 
-def setup_logger(name="daily_runner", log_file="logs.txt"):
-    """Sets up a logger that writes to console and file."""
+def setup_logger(name="daily_runner", log_file="logs.txt", max_bytes=1024 * 1024, backups=3):
+    """Sets up a logger that writes to console and file (rotated at max_bytes)."""
     logger = logging.getLogger(name)
     logger.setLevel(logging.INFO)
     
@@ -15,8 +16,10 @@ def setup_logger(name="daily_runner", log_file="logs.txt"):
     ch.setFormatter(formatter)
     logger.addHandler(ch)
     
-    # File Handler
-    fh = logging.FileHandler(log_file, encoding='utf-8')
+    # File Handler (logs.txt.1 .. logs.txt.<backups> keep older lines), opened on the first record
+    fh = logging.handlers.RotatingFileHandler(
+        log_file, maxBytes=max_bytes, backupCount=backups, encoding='utf-8', delay=True
+    )
     fh.setFormatter(formatter)
     logger.addHandler(fh)
     
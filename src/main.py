@@ -1,25 +1,51 @@
 import argparse
 import sys
-from src.topic_picker import topic_picker
-from src.pipeline import pipeline
-from src.utils_time import get_npt_time_today, get_three_daily_schedules
-from src.report import report_manager
-from src.logger import logger
-import shutil
-from src.config_loader import config
 
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--count", type=int, default=3, help="Number of videos to generate")
+    parser.add_argument("--serial", action="store_true", help="Process stories one at a time instead of pipelining stages")
+    parser.add_argument("--resume", action="store_true", help="Finish unfinished stories from earlier runs first, skipping their completed stages")
+    parser.add_argument("--profile", action="store_true", help="Print time, CPU, bytes and retries per stage at the end of the run")
     args = parser.parse_args()
 
+    # Imported after argument parsing so --help and bad arguments return at once
+    from src.topic_picker import topic_picker
+    from src.pipeline import pipeline
+    from src.gemini_story import gemini_generator
+    from src.scheduler import StoryScheduler
+    from src.utils_time import get_three_daily_schedules
+    from src.report import report_manager
+    from src.logger import logger
+    from src.cache import artifact_cache
+    from src.checkpoint import checkpoint_store
+    from src.workspace import workspace_manager
+    from src.tracing import tracer
+    from src.upload_queue import upload_queue
+
     logger.info("Starting Daily Run")
 
-    # 1. Pick Topics
-    topics = topic_picker.get_next_topics(count=args.count)
-    if not topics:
+    # Uploads left queued by earlier runs go out while this run renders
+    upload_queue.start()
+
+    # 1. Pick Topics (unfinished stories from earlier runs go first with --resume)
+    resumed = []
+    if args.resume:
+        for checkpoint in checkpoint_store.pending():
+            if checkpoint.attempts >= checkpoint_store.max_attempts:
+                pipeline.give_up(checkpoint)
+            elif len(resumed) < args.count:
+                resumed.append(checkpoint)
+    for checkpoint in resumed:
+        logger.info(f"Resuming {checkpoint.story_id} (done: {', '.join(checkpoint.data['stages']) or 'nothing'})")
+
+    topics = []
+    if args.count > len(resumed):
+        topics = topic_picker.get_next_topics(count=args.count - len(resumed))
+    if not topics and not resumed:
         logger.error("No topics available.")
+        upload_queue.close()
         sys.exit(1)
 
     # 2. Define Schedule Times (NPT)
@@ -27,26 +53,54 @@ def main():
     schedule_times = get_three_daily_schedules()[:args.count]
 
     # 3. Pipeline Loop
-    for i, topic in enumerate(topics):
+    work = [(c.topic, c.story_id) for c in resumed] + [(t, None) for t in topics]
+    jobs = []
+    for i, (topic, story_id) in enumerate(work):
         if i < len(schedule_times):
             sched_time = schedule_times[i]
         else:
             # Fallback for >3 videos: spaced out by 1 hour
             sched_time = schedule_times[-1]  # Simplification
+        jobs.append(pipeline.create_job(topic, sched_time, story_id=story_id, resume=story_id is not None))
+
+    # Scripts for all new stories in as few Gemini requests as possible
+    if gemini_generator.batch_size > 1:
+        to_script = [job.topic for job in jobs if not job.checkpoint.is_done("script")]
+        if len(to_script) > 1:
+            gemini_generator.prefetch(to_script)
 
-        try:
-            pipeline.process_story(topic, sched_time)
-        except Exception as e:
-            logger.error(f"Critical error processing topic {topic.get('id')}: {e}")
-            # Continue to next
+    if args.serial:
+        for job in jobs:
+            try:
+                pipeline.run_job(job)
+            except Exception as e:
+                logger.error(f"Critical error processing topic {job.topic_id}: {e}")
+                # Continue to next
+    else:
+        # Stories flow through script -> media -> render -> upload worker pools
+        StoryScheduler(pipeline).run(jobs)
+
+    # Wait for the background uploader to get through the queue
+    upload_queue.close()
 
     # 4. Finalize Report
     report_manager.save()
 
     # 5. Global Cleanup (optional extra sweep)
-    # Remove files in temp
-    shutil.rmtree(config.root_dir / "temp", ignore_errors=True)
-    (config.root_dir / "temp").mkdir()
+    # Remove this run's workspaces (and stale leftovers), except those of
+    # unfinished stories that --resume can reuse
+    pending = {c.story_id for c in checkpoint_store.pending()}
+    for job in jobs:
+        if job.story_id not in pending:
+            job.workspace.cleanup()
+    workspace_manager.sweep(keep=pending)
+
+    # Keep the API result cache within CACHE_MAX_MB (least recently used first)
+    artifact_cache.prune()
+
+    if args.profile:
+        print(f"\nRun profile (spans in {tracer.trace_file}):")
+        print(tracer.format_summary())
 
 
 if __name__ == "__main__":
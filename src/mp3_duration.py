@@ -0,0 +1,157 @@
+"""
+In-process MP3 duration probing.
+
+Mp3DurationParser is fed the bytes of an MP3 as they arrive and works out the
+playing time from the frame headers, or from the Xing/Info or VBRI header that
+VBR encoders put in the first frame. The narration length is therefore known
+as soon as the download finishes, without starting an ffprobe process.
+"""
+
+# Bitrates in kbps by bitrate index (0 = free format, 15 = invalid)
+BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+# Sample rates by version bits (0 = MPEG-2.5, 2 = MPEG-2, 3 = MPEG-1)
+SAMPLE_RATES = {
+    0: (11025, 12000, 8000),
+    2: (22050, 24000, 16000),
+    3: (44100, 48000, 32000),
+}
+
+# Bytes of the first frame needed to look for a Xing/Info or VBRI header
+VBR_HEADER_BYTES = 64
+
+
+class Mp3DurationParser:
+    def __init__(self):
+        self._buf = bytearray()
+        self._skip = 0
+        self._checked_id3 = False
+        self._stream = None  # (version, layer, sample_rate) of the first frame
+        self._vbr_seconds = None
+        self.frames = 0
+        self.frame_seconds = 0.0
+
+    @property
+    def duration(self):
+        """Seconds of audio, or None if no MPEG audio frame was seen."""
+        if self._vbr_seconds is not None:
+            return self._vbr_seconds
+        return self.frame_seconds if self.frames else None
+
+    @property
+    def complete(self):
+        # A Xing/VBRI frame count already gives the total, the rest need not be read
+        return self._vbr_seconds is not None
+
+    def feed(self, data):
+        buf = self._buf
+        buf += data
+        pos = 0
+        while True:
+            if self._skip:
+                step = min(self._skip, len(buf) - pos)
+                pos += step
+                self._skip -= step
+                if self._skip:
+                    break
+
+            if not self._checked_id3:
+                if len(buf) - pos < 10:
+                    break
+                self._checked_id3 = True
+                if buf[pos:pos + 3] == b"ID3":
+                    # Syncsafe size (7 bits per byte), plus the optional footer
+                    size = (buf[pos + 6] << 21) | (buf[pos + 7] << 14) | (buf[pos + 8] << 7) | buf[pos + 9]
+                    self._skip = 10 + size + (10 if buf[pos + 5] & 0x10 else 0)
+                    continue
+
+            if len(buf) - pos < 4:
+                break
+            header = self._parse_header(buf, pos)
+            if header is None:
+                pos += 1  # Not a frame boundary (junk or trailing tags), resync
+                continue
+            version, layer, sample_rate, samples, length = header
+
+            if self._stream is None:
+                if len(buf) - pos < min(length, VBR_HEADER_BYTES):
+                    break
+                self._stream = (version, layer, sample_rate)
+                total_frames = self._vbr_frame_count(buf, pos, version)
+                if total_frames:
+                    self._vbr_seconds = total_frames * samples / sample_rate
+                    self._skip = length  # The header frame carries no audio
+                    continue
+
+            self.frames += 1
+            self.frame_seconds += samples / sample_rate
+            self._skip = length
+
+        del buf[:pos]
+
+    def _parse_header(self, buf, pos):
+        b1, b2, b3 = buf[pos + 1], buf[pos + 2], buf[pos + 3]
+        if buf[pos] != 0xFF or (b1 & 0xE0) != 0xE0:
+            return None
+        version = (b1 >> 3) & 0x03
+        layer = 4 - ((b1 >> 1) & 0x03)  # 1, 2 or 3; 4 means reserved
+        bitrate_idx = b2 >> 4
+        rate_idx = (b2 >> 2) & 0x03
+        if version == 1 or layer == 4 or bitrate_idx in (0, 15) or rate_idx == 3:
+            return None
+
+        sample_rate = SAMPLE_RATES[version][rate_idx]
+        if self._stream is not None and self._stream != (version, layer, sample_rate):
+            return None  # A false sync inside frame data
+
+        bitrate = BITRATES[(1 if version == 3 else 2, layer)][bitrate_idx] * 1000
+        padding = (b2 >> 1) & 0x01
+        if layer == 1:
+            samples = 384
+            length = (12 * bitrate // sample_rate + padding) * 4
+        elif layer == 3 and version != 3:
+            samples = 576
+            length = 72 * bitrate // sample_rate + padding
+        else:
+            samples = 1152
+            length = 144 * bitrate // sample_rate + padding
+        return version, layer, sample_rate, samples, length
+
+    def _vbr_frame_count(self, buf, pos, version):
+        mono = (buf[pos + 3] >> 6) == 3
+        # Xing/Info sits right after the side information
+        if version == 3:
+            side_info = 17 if mono else 32
+        else:
+            side_info = 9 if mono else 17
+        xing = pos + 4 + side_info
+        if buf[xing:xing + 4] in (b"Xing", b"Info"):
+            flags = int.from_bytes(buf[xing + 4:xing + 8], "big")
+            if flags & 0x01:
+                return int.from_bytes(buf[xing + 8:xing + 12], "big")
+            return None
+
+        # VBRI always sits 32 bytes after the header
+        vbri = pos + 4 + 32
+        if buf[vbri:vbri + 4] == b"VBRI":
+            return int.from_bytes(buf[vbri + 14:vbri + 18], "big")
+        return None
+
+
+def mp3_duration(path, chunk_size=64 * 1024):
+    """Duration of an MP3 file in seconds, or None if it holds no MPEG audio."""
+    parser = Mp3DurationParser()
+    with open(path, "rb") as f:
+        while not parser.complete:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            parser.feed(chunk)
+    return parser.duration
@@ -1,6 +1,7 @@
 import os
 import time
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from src.logger import logger
 from src.config_loader import config
@@ -9,20 +10,54 @@ from src.pollinations_images import image_generator
 from src.elevenlabs_voice import voice_generator
 from src.video_ffmpeg import video_editor
 from src.thumbnail import thumbnail_generator
-from src.youtube_upload import youtube_uploader
+from src.upload_queue import upload_queue
 from src.report import report_manager
+from src.checkpoint import checkpoint_store
+from src.workspace import workspace_manager
+from src.mp3_duration import mp3_duration
+from src.alignment import scene_aligner
+from src.tracing import tracer
+from src.topic_store import topic_store
 from src.utils_time import validate_schedule_time, npt_to_utc_iso
 
+
+class StoryJob:
+    """
+    State of one story as it moves through the pipeline stages.
+    """
+    def __init__(self, topic, schedule_time_npt, story_id=None):
+        self.topic = topic
+        self.topic_id = topic['id']
+        self.story_id = story_id or f"{time.strftime('%Y-%m-%d')}_{topic['id']}"
+        self.schedule_time_npt = schedule_time_npt
+        self.checkpoint = None
+        self.workspace = None
+
+        self.story = None
+        self.title = "N/A"
+        self.audio_path = None
+        self.scenes = []
+        self.video_path = None
+        self.thumb_path = None
+
+
 class VideoPipeline:
+    # Stages run in this order; each one is a run_<stage>(job) method returning bool
+    STAGES = ("script", "media", "render", "upload")
+
     def __init__(self):
-        self.temp_dir = config.root_dir / "temp"
         self.output_dir = config.output_dir
-        self.temp_dir.mkdir(exist_ok=True)
 
     def _get_audio_duration_sec(self, audio_path: str) -> float:
         """
-        Returns duration of audio file in seconds using ffprobe.
+        Returns duration of audio file in seconds, read from the MP3 frame
+        headers in-process. ffprobe is only started for files the parser
+        does not understand.
         """
+        duration = mp3_duration(audio_path)
+        if duration:
+            return duration
+
         cmd = [
             "ffprobe",
             "-v", "error",
@@ -33,108 +68,201 @@ class VideoPipeline:
         result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
         return float(result.stdout.strip())
 
-    def process_story(self, topic, schedule_time_npt):
-        story_id = f"{time.strftime('%Y-%m-%d')}_{topic['id']}"
-        topic_id = topic['id']
-        logger.info(f"Starting pipeline for {story_id}")
+    def create_job(self, topic, schedule_time_npt, story_id=None, resume=False):
+        """
+        With resume=True an existing manifest for story_id is reused, so stages it
+        records as done (with intact artifacts) are skipped.
+        """
+        job = StoryJob(topic, schedule_time_npt, story_id)
+        job.checkpoint = checkpoint_store.start(job.story_id, topic, resume=resume)
+        job.workspace = workspace_manager.open(job.story_id)
+        return job
 
+    def run_stage(self, stage, job):
+        if job.checkpoint.is_done(stage):
+            logger.info(f"[Checkpoint] {job.story_id}: stage '{stage}' already done, skipping")
+            self._restore_stage(stage, job)
+            return True
+        with tracer.span(stage, story_id=job.story_id) as span:
+            ok = getattr(self, f"run_{stage}")(job)
+            if not ok:
+                span.status = "failed"
+            return ok
+
+    def _restore_stage(self, stage, job):
+        data = job.checkpoint.get(stage)
+        if stage == "script":
+            job.story = data["story"]
+            job.title = job.story.get("title", "Nepali Short")
+        elif stage == "media":
+            job.audio_path = Path(data["audio_path"])
+            job.scenes = data["scenes"]
+        elif stage == "render":
+            job.video_path = Path(data["video_path"])
+            job.thumb_path = Path(data["thumb_path"])
+
+    def process_story(self, topic, schedule_time_npt, story_id=None, resume=False):
+        self.run_job(self.create_job(topic, schedule_time_npt, story_id, resume))
+
+    def run_job(self, job):
+        logger.info(f"Starting pipeline for {job.story_id}")
+        for stage in self.STAGES:
+            if not self.run_stage(stage, job):
+                return
+
+    def _fail(self, job, error, publish_at="N/A"):
+        report_manager.add_entry(job.story_id, job.topic_id, job.title, publish_at, None, "FAILED", error)
+        topic_store.record_outcome(job.topic_id, "FAILED")
+        return False
+
+    def give_up(self, checkpoint):
+        """Marks an unfinished story FAILED once it has used its CHECKPOINT_MAX_ATTEMPTS runs."""
+        story = checkpoint.get("script").get("story") or {}
+        logger.warning(f"[Checkpoint] {checkpoint.story_id}: giving up after {checkpoint.attempts} attempts")
+        checkpoint.mark_failed()
+        report_manager.add_entry(
+            checkpoint.story_id, checkpoint.topic["id"], story.get("title", "N/A"), "N/A", None,
+            "FAILED", f"Gave up after {checkpoint.attempts} attempts"
+        )
+        topic_store.record_outcome(checkpoint.topic["id"], "FAILED")
+
+    def run_script(self, job):
         # 1. Generate Script
         try:
-            story = gemini_generator.generate_story(topic)
+            job.story = gemini_generator.generate_story(job.topic)
         except Exception as e:
-            report_manager.add_entry(story_id, topic_id, "N/A", "N/A", None, "FAILED", f"Script Gen missing: {e}")
-            return
-
-        title = story.get("title", "Nepali Short")
-        scenes = story.get("scenes", [])
-        narration = story.get("narration_text", "")
-        
-        # 2. Generate Audio
-        audio_path = self.temp_dir / f"{story_id}_narration.mp3"
-        if not voice_generator.generate_audio(narration, audio_path):
-             report_manager.add_entry(story_id, topic_id, title, "N/A", None, "FAILED", "Audio Gen failed")
-             return
-
-        # 3. Generate Scene Images
-        processed_scenes = []
-        for i, scene in enumerate(scenes):
-            prompt = scene.get("visual_prompt", "")
-            duration = scene.get("duration_sec", 5)
-            text = scene.get("on_screen_text", "")
-            
-            img_path = self.temp_dir / f"{story_id}_scene_{i}.jpg"
-            if image_generator.generate_image(prompt, img_path):
-                processed_scenes.append({
-                    "image_path": str(img_path),
-                    "text": text,
-                    "duration": duration
-                })
-            else:
-                logger.warning(f"Skipping scene {i} due to image generation failure")
+            return self._fail(job, f"Script Gen missing: {e}")
+
+        job.title = job.story.get("title", "Nepali Short")
+
+        # Kept in the manifest itself: state/ survives between CI runs, temp/ does
+        # not, and regenerating the script on a later day would miss the cache
+        job.checkpoint.mark_done("script", data={"story": job.story})
+        return True
+
+    def run_media(self, job):
+        scenes = job.story.get("scenes", [])
+        narration = job.story.get("narration_text", "")
+
+        # 2 + 3. Generate Audio and Scene Images concurrently
+        # Narration and scene images are independent network calls: the narration
+        # runs beside a bounded image pool, so the story waits for its slowest call.
+        audio_path = job.workspace.path("narration.mp3")
+        max_in_flight = max(1, int(config.settings.get("IMAGE_MAX_IN_FLIGHT", 4)))
+
+        with ThreadPoolExecutor(max_workers=1) as audio_pool, ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+            audio_future = audio_pool.submit(
+                tracer.wrap(voice_generator.generate_audio, "audio", chars=len(narration)), narration, audio_path
+            )
+            image_futures = []
+            for i, scene in enumerate(scenes):
+                img_path = job.workspace.path(f"scene_{i}.{image_generator.extension}")
+                image_futures.append(
+                    (img_path, pool.submit(
+                        tracer.wrap(image_generator.generate_image, "image", scene=i),
+                        scene.get("visual_prompt", ""), img_path, target_size=video_editor.working_size()
+                    ))
+                )
+
+            audio = audio_future.result()
+            if not audio:
+                for _, future in image_futures:
+                    future.cancel()
+                return self._fail(job, "Audio Gen failed")
+
+            # Collect in scene order; failed scenes are skipped as before
+            processed_scenes = []
+            for i, (scene, (img_path, future)) in enumerate(zip(scenes, image_futures)):
+                try:
+                    ok = future.result()
+                except Exception as e:
+                    logger.warning(f"Scene {i} image generation raised: {e}")
+                    ok = False
+
+                if ok:
+                    processed_scenes.append({
+                        "image_path": str(img_path),
+                        "text": scene.get("on_screen_text", ""),
+                        "duration": scene.get("duration_sec", 5)
+                    })
+                else:
+                    logger.warning(f"Skipping scene {i} due to image generation failure")
 
         if not processed_scenes:
-            report_manager.add_entry(story_id, topic_id, title, "N/A", None, "FAILED", "No scenes generated")
-            return
+            return self._fail(job, "No scenes generated")
 
-        # ✅ Normalize total scene duration to match narration duration
+        # Share the narration length out across all scenes, cutting between sentences
         try:
-            narration_sec = self._get_audio_duration_sec(str(audio_path))
-            scenes_sec = sum(float(s["duration"]) for s in processed_scenes)
-            diff = narration_sec - scenes_sec
-
-            # Adjust only if mismatch is noticeable
-            if abs(diff) > 0.3:
-                last_before = float(processed_scenes[-1]["duration"])
-                processed_scenes[-1]["duration"] = max(2.0, last_before + diff)
-                logger.info(
-                    f"Adjusted last scene duration by {diff:.2f}s to match narration. "
-                    f"Last scene: {last_before:.2f}s -> {processed_scenes[-1]['duration']:.2f}s | "
-                    f"Scenes total was {scenes_sec:.2f}s, narration is {narration_sec:.2f}s"
+            with tracer.span("duration_probe"):
+                narration_sec = audio["duration"] or self._get_audio_duration_sec(str(audio_path))
+            with tracer.span("align", units=len(processed_scenes)):
+                processed_scenes = scene_aligner.align(
+                    processed_scenes, audio_path, narration_sec, audio.get("segments"), video_editor.fps
                 )
         except Exception as e:
-            logger.warning(f"Could not normalize scene durations to narration length: {e}")
+            logger.warning(f"Could not align scene durations to narration: {e}")
 
-        # 4. Assemble Video
-        video_path = self.output_dir / f"{story_id}.mp4"
+        job.audio_path = audio_path
+        job.scenes = processed_scenes
+        job.checkpoint.mark_done(
+            "media",
+            [audio_path] + [s["image_path"] for s in processed_scenes],
+            {"audio_path": str(audio_path), "scenes": processed_scenes}
+        )
+        return True
+
+    def run_render(self, job):
+        # 4. Assemble Video (in the workspace, then moved into outputs/ in one step)
+        work_video = job.workspace.path("video.mp4")
         if not video_editor.assemble_video(
-            processed_scenes,
-            str(audio_path),
-            str(video_path),
-            str(self.temp_dir),
-            topic.get("category")  # ✅ pass category so correct BGM is selected
+            job.scenes,
+            str(job.audio_path),
+            str(work_video),
+            str(job.workspace.dir),
+            job.topic.get("category")  # ✅ pass category so correct BGM is selected
         ):
-            report_manager.add_entry(story_id, topic_id, title, "N/A", None, "FAILED", "Video assembly failed")
-            return
+            return self._fail(job, "Video assembly failed")
+        video_path = job.workspace.publish(work_video, self.output_dir / f"{job.story_id}.mp4")
 
         # 5. Thumbnail (Optional uses first image)
-        thumb_path = self.output_dir / f"{story_id}_thumb.png"
-        thumbnail_generator.create_thumbnail(processed_scenes[0]['image_path'], title, str(thumb_path))
+        thumb_path = self.output_dir / f"{job.story_id}_thumb.png"
+        work_thumb = job.workspace.path("thumb.png")
+        with tracer.span("thumbnail"):
+            thumb_ok = thumbnail_generator.create_thumbnail(job.scenes[0]['image_path'], job.title, str(work_thumb))
+        if thumb_ok:
+            job.workspace.publish(work_thumb, thumb_path)
+
+        job.video_path = video_path
+        job.thumb_path = thumb_path
+        job.checkpoint.mark_done(
+            "render",
+            [p for p in (video_path, thumb_path) if p.exists()],
+            {"video_path": str(video_path), "thumb_path": str(thumb_path)}
+        )
+        return True
 
-        # 6. Upload  ✅ FIX: handle both string ISO and datetime input safely
+    def run_upload(self, job):
+        story = job.story
+        schedule_time_npt = job.schedule_time_npt
+
+        # 6. Queue the upload  ✅ FIX: handle both string ISO and datetime input safely
         if isinstance(schedule_time_npt, str):
             utc_publish_time = schedule_time_npt
         else:
             utc_publish_time = npt_to_utc_iso(validate_schedule_time(schedule_time_npt))
-        
-        description = f"{title}\n\n{story['narration_text'][:200]}...\n\n#shorts #nepali #story"
+
+        description = f"{job.title}\n\n{story['narration_text'][:200]}...\n\n#shorts #nepali #story"
         tags = story.get("hashtags", []) + ["shorts", "nepali"]
-        
-        video_id = youtube_uploader.upload_video(str(video_path), title, description, tags, utc_publish_time)
-        
-        if video_id:
-            report_manager.add_entry(story_id, topic_id, title, str(schedule_time_npt), video_id, "SUCCESS")
-        else:
-             report_manager.add_entry(story_id, topic_id, title, str(schedule_time_npt), None, "FAILED", "Upload failed")
-
-        # Cleanup
-        self._cleanup(story_id)
-
-    def _cleanup(self, story_id):
-        # Delete temp files starting with story_id
-        for p in self.temp_dir.glob(f"{story_id}*"):
-            try:
-                p.unlink()
-            except:
-                pass
+
+        # The upload itself runs on the upload queue's thread, so the next
+        # story can render meanwhile; a failed upload stays queued for the next run
+        # Manifest first: the uploader marks it complete from its own thread
+        job.checkpoint.mark_done("upload", data={"queued": True})
+        job.checkpoint.mark_queued()
+        upload_queue.put(job, description, tags, utc_publish_time)
+
+        # Cleanup (the video is already in outputs/)
+        job.workspace.cleanup()
+        return True
 
 pipeline = VideoPipeline()
@@ -1,10 +1,13 @@
 # src/pollinations_images.py
-import requests
-from PIL import Image
+from functools import cached_property
 from io import BytesIO
 import os
 import time
 from src.logger import logger
+from src.config_loader import config
+from src.cache import artifact_cache
+from src.http_client import http_client
+from src.tracing import tracer
 
 
 class ImageGenerator:
@@ -13,19 +16,46 @@ class ImageGenerator:
         "natural skin texture, realistic faces, Nepal middle class context"
     )
 
+    # Scene image formats (IMAGE_FORMAT): Pillow save arguments and file extension.
+    # JPEG q95 saves ~100x faster than optimized PNG and is far cheaper for FFmpeg
+    # to decode (python -m benchmarks.bench_image_formats).
+    IMAGE_FORMATS = {
+        "jpeg": ({"format": "JPEG", "quality": 95}, "jpg"),
+        "png": ({"format": "PNG", "compress_level": 0}, "png"),  # lossless, uncompressed
+    }
+
     def __init__(self):
-        # Keep old variable name style: api_key
-        # (Only env var names are Worker-specific)
-        self.worker_url = os.getenv(
+        # Checked on the first request rather than at import
+        self._key_checked = False
+
+    # Keep old variable name style: api_key
+    # (Only env var names are Worker-specific)
+    @cached_property
+    def worker_url(self):
+        return config.getenv(
             "WORKER_API_URL",
             "https://techkoseli.liladharbhatta9.workers.dev"
         )
-        self.api_key = os.getenv("WORKER_API_KEY")
 
-        if not self.api_key:
-            logger.warning(
-                "[WorkerAI] WORKER_API_KEY not set. Requests may fail or be rejected."
-            )
+    @cached_property
+    def api_key(self):
+        return config.getenv("WORKER_API_KEY")
+
+    @cached_property
+    def image_format(self):
+        image_format = config.settings.get("IMAGE_FORMAT", "jpeg")
+        if image_format not in self.IMAGE_FORMATS:
+            logger.warning(f"Unknown IMAGE_FORMAT '{image_format}', using jpeg")
+            image_format = "jpeg"
+        return image_format
+
+    @property
+    def save_options(self):
+        return self.IMAGE_FORMATS[self.image_format][0]
+
+    @property
+    def extension(self):
+        return self.IMAGE_FORMATS[self.image_format][1]
 
     def generate_image(
         self,
@@ -34,25 +64,39 @@ class ImageGenerator:
         width: int = 1080,
         height: int = 1920,
         retries: int = 3,
-        delay: float = 2.0
+        delay: float = 2.0,
+        target_size: tuple = None
     ) -> bool:
         """
         Generate image via Cloudflare Worker AI and save it.
         Mirrors the Pollinations approach:
         - enhanced prompt
-        - retries + delay
+        - retries with jittered backoff from `delay` (or the server's Retry-After)
         - content-type validation
-        - saves PNG for FFmpeg safety
+        - normalised once to target_size (default width x height) in IMAGE_FORMAT;
+          output_path should use self.extension
         """
+        target_size = tuple(target_size or (width, height))
 
         enhanced_prompt = f"{prompt}, {self.BASE_STYLE}"
         payload = {"prompt": enhanced_prompt, "width": width, "height": height}
 
+        # Same prompt + style + size + stored format → reuse the image we already paid for
+        cache_key = artifact_cache.make_key(enhanced_prompt, width, height, target_size, self.image_format)
+        if artifact_cache.get_file("images", cache_key, output_path):
+            return True
+
         headers = {
             "User-Agent": "Mozilla/5.0",
             "Content-Type": "application/json",
         }
 
+        if not self.api_key and not self._key_checked:
+            logger.warning(
+                "[WorkerAI] WORKER_API_KEY not set. Requests may fail or be rejected."
+            )
+        self._key_checked = True
+
         # Only add auth header if key exists (same technique as old code)
         if self.api_key:
             headers["Authorization"] = f"Bearer {self.api_key}"
@@ -60,12 +104,14 @@ class ImageGenerator:
         logger.info(f"[WorkerAI] Generating image: {prompt[:60]}")
 
         for attempt in range(1, retries + 1):
+            response = None
             try:
-                response = requests.post(
+                # Retries are counted by this loop, which also covers bad content
+                response = http_client.post(
                     self.worker_url,
                     json=payload,
                     headers=headers,
-                    timeout=60
+                    retries=0
                 )
 
                 if response.status_code != 200:
@@ -80,22 +126,41 @@ class ImageGenerator:
                     body_preview = (response.text or "")[:300]
                     raise RuntimeError(f"Invalid content-type: {content_type} | body: {body_preview}")
 
-                img = Image.open(BytesIO(response.content)).convert("RGB")
-
-                # PNG is safer for FFmpeg zoom/pan + subtitles
-                img.save(output_path, format="PNG", optimize=True)
+                self._normalize(response.content, output_path, target_size)
 
                 logger.info(f"[WorkerAI] Image saved → {output_path}")
+                tracer.add(billed_images=1)
+                artifact_cache.put_file("images", cache_key, output_path)
                 return True
 
             except Exception as e:
                 logger.warning(f"[WorkerAI] Attempt {attempt}/{retries} failed: {e}")
                 if attempt < retries:
-                    time.sleep(delay)
+                    tracer.add(retries=1)
+                    time.sleep(http_client.retry_delay(attempt, response, base=delay))
 
         logger.error("[WorkerAI] Image generation failed after retries")
         return False
 
+    def _normalize(self, data, output_path, size):
+        """
+        Writes the image at exactly `size` in IMAGE_FORMAT, the only resize it
+        gets before FFmpeg. Other aspect ratios are scaled to cover and
+        center-cropped rather than stretched.
+        """
+        from PIL import Image, ImageOps
+        img = Image.open(BytesIO(data))  # Lazy: only the header is read here
+        if img.size == size and img.format == self.save_options["format"] and img.mode == "RGB":
+            # Already what we would write: keep the worker's bytes, no re-encode
+            with open(output_path, "wb") as f:
+                f.write(data)
+            return
+
+        img = img.convert("RGB")
+        if img.size != size:
+            img = ImageOps.fit(img, size, Image.LANCZOS)
+        img.save(output_path, **self.save_options)
+
 
 # IMPORTANT: module-level instance so this import works:
 # from src.pollinations_images import image_generator
@@ -106,5 +171,5 @@ if __name__ == "__main__":
     # Manual quick test
     image_generator.generate_image(
         prompt="Beautiful Himalaya mountains at sunrise",
-        output_path="himalaya.png"
+        output_path=f"himalaya.{image_generator.extension}"  # matches IMAGE_FORMAT
     )
@@ -0,0 +1,76 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Refills `per_minute` tokens per minute, holding at most one minute's worth.
+
+    reserve() always succeeds and may take the balance negative: the caller is
+    told how long to wait until its share has refilled. Waiters are therefore
+    served in the order they asked, without polling.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount, now):
+        self._refill(now)
+        self.tokens -= min(float(amount), self.capacity)
+        return max(0.0, -self.tokens / self.rate)
+
+    def adjust(self, amount, now):
+        # Correct an earlier estimate once the real cost is known (negative refunds)
+        self._refill(now)
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class RateLimiter:
+    """
+    Request-per-minute and (optionally) token-per-minute budgets for one API.
+
+    acquire() blocks until both budgets allow the call. When the server
+    rejects a call for quota anyway, backoff() pauses every caller for the
+    delay it asked for, so queued requests wait instead of failing.
+    """
+
+    def __init__(self, rpm, tpm=None):
+        self._lock = threading.Lock()
+        self._requests = TokenBucket(rpm) if rpm else None
+        self._tokens = TokenBucket(tpm) if tpm else None
+        self._blocked_until = 0.0
+
+    def acquire(self, tokens=0):
+        """Blocks until the call may be made. Returns the seconds spent waiting."""
+        with self._lock:
+            now = time.monotonic()
+            wait = 0.0
+            if self._requests:
+                wait = max(wait, self._requests.reserve(1, now))
+            if self._tokens and tokens:
+                wait = max(wait, self._tokens.reserve(tokens, now))
+
+        waited = 0.0
+        while True:
+            # A backoff() while we slept pushes our slot back too
+            remaining = max(wait - waited, self._blocked_until - time.monotonic())
+            if remaining <= 0:
+                return waited
+            time.sleep(remaining)
+            waited += remaining
+
+    def record_usage(self, estimated, actual):
+        if self._tokens and actual is not None:
+            with self._lock:
+                self._tokens.adjust(actual - estimated, time.monotonic())
+
+    def backoff(self, seconds):
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
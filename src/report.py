@@ -1,12 +1,16 @@
 import json
 import os
+import threading
 from datetime import datetime
 from src.config_loader import config
 from src.logger import logger
+from src.tracing import tracer
+from src.run_history import run_history
 
 class DailyReport:
     def __init__(self):
         self.entries = []
+        self._lock = threading.Lock()  # Stories report from scheduler worker threads
         self.start_time = datetime.now()
         self.report_file = config.root_dir / "report.json"
 
@@ -21,10 +25,17 @@ class DailyReport:
             "error": str(error) if error else None,
             "timestamp": datetime.now().isoformat()
         }
-        self.entries.append(entry)
-        logger.info(f"Report Entry Added: {json.dumps(entry, indent=2)}")
+        with self._lock:
+            self.entries.append(entry)
+        # One line per entry; the full history goes to state/history.db
+        logger.info(f"Report Entry Added: {json.dumps(entry, ensure_ascii=False)}")
 
     def save(self):
+        # Per-stage timings from the trace (complete only once the stories are done)
+        with self._lock:
+            for entry in self.entries:
+                entry["stages"] = tracer.summary(entry["story_id"])
+
         report_data = {
             "run_date": self.start_time.strftime("%Y-%m-%d"),
             "run_start_time": self.start_time.isoformat(),
@@ -35,5 +46,6 @@ class DailyReport:
         with open(self.report_file, 'w', encoding='utf-8') as f:
             json.dump(report_data, f, indent=2, ensure_ascii=False)
         logger.info(f"Report saved to {self.report_file}")
+        run_history.record(report_data)
 
 report_manager = DailyReport()
@@ -0,0 +1,245 @@
+import argparse
+import math
+import sqlite3
+import threading
+from contextlib import closing
+from datetime import date, timedelta
+from functools import cached_property
+from src.config_loader import config
+from src.logger import logger
+from src.tracing import tracer
+from src.topic_store import topic_store
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    run_date TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    ended_at TEXT NOT NULL,
+    shared_tokens INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS videos (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    run_date TEXT NOT NULL,
+    story_id TEXT NOT NULL,
+    topic_id TEXT,
+    category TEXT,
+    title TEXT,
+    status TEXT NOT NULL,
+    error TEXT,
+    publish_at TEXT,
+    youtube_video_id TEXT,
+    timestamp TEXT,
+    gemini_tokens INTEGER NOT NULL DEFAULT 0,
+    tts_chars INTEGER NOT NULL DEFAULT 0,
+    images INTEGER NOT NULL DEFAULT 0,
+    upload_bytes INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS stages (
+    video_id INTEGER NOT NULL REFERENCES videos (id),
+    name TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    wall REAL NOT NULL,
+    cpu REAL NOT NULL,
+    bytes INTEGER NOT NULL,
+    retries INTEGER NOT NULL,
+    units INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_runs_date ON runs (run_date);
+CREATE INDEX IF NOT EXISTS idx_videos_date ON videos (run_date);
+CREATE INDEX IF NOT EXISTS idx_videos_topic ON videos (topic_id);
+CREATE INDEX IF NOT EXISTS idx_videos_category ON videos (category);
+CREATE INDEX IF NOT EXISTS idx_videos_status ON videos (status, run_date);
+CREATE INDEX IF NOT EXISTS idx_stages_video ON stages (video_id);
+CREATE INDEX IF NOT EXISTS idx_stages_name ON stages (name, wall);
+"""
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(len(sorted_values) * pct / 100))
+    return sorted_values[rank - 1]
+
+
+class RunHistory:
+    """
+    Every run's report entries, span totals and billed usage, appended to
+    SQLite (state/history.db). report.json still holds the latest run only.
+
+    Usage is stored as quantities (Gemini tokens, narration characters,
+    generated images, uploaded bytes) and priced by COST_RATES when a report
+    is made, so a price change applies to old runs too.
+    """
+
+    def __init__(self):
+        self.db_path = config.state_dir / "history.db"
+        self._lock = threading.Lock()
+
+    @cached_property
+    def rates(self):
+        return config.settings.get("COST_RATES") or {}
+
+    def _connect(self):
+        self.db_path.parent.mkdir(exist_ok=True)
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        conn.executescript(SCHEMA)
+        return conn
+
+    def _usage(self, records):
+        """Billed quantities per story_id from trace records; None holds shared requests."""
+        usage = {}
+        for r in records:
+            u = usage.setdefault(r["story_id"], {"gemini_tokens": 0, "tts_chars": 0, "images": 0, "upload_bytes": 0})
+            if r["name"] == "gemini_request":
+                u["gemini_tokens"] += r["units"]
+            elif r["name"] == "youtube_upload" and r["status"] == "ok":
+                u["upload_bytes"] += r["bytes"]
+            u["tts_chars"] += r.get("billed_chars", 0)
+            u["images"] += r.get("billed_images", 0)
+        return usage
+
+    def record(self, report_data):
+        """Appends one run (DailyReport.save's report_data) with its videos and stage totals."""
+        entries = report_data["videos"]
+        usage = self._usage(tracer.snapshot())
+        categories = topic_store.categories({e["topic_id"] for e in entries})
+        empty = {"gemini_tokens": 0, "tts_chars": 0, "images": 0, "upload_bytes": 0}
+
+        try:
+            with self._lock, closing(self._connect()) as conn, conn:
+                run_id = conn.execute(
+                    "INSERT INTO runs (run_date, started_at, ended_at, shared_tokens) VALUES (?, ?, ?, ?)",
+                    (report_data["run_date"], report_data["run_start_time"], report_data["run_end_time"],
+                     usage.get(None, empty)["gemini_tokens"])
+                ).lastrowid
+                # Usage and stage totals go with a story's first entry in the run
+                counted = set()
+                for e in entries:
+                    first = e["story_id"] not in counted
+                    counted.add(e["story_id"])
+                    u = usage.get(e["story_id"], empty) if first else empty
+                    stages = (e.get("stages") or {}) if first else {}
+                    video_id = conn.execute(
+                        """
+                        INSERT INTO videos (run_id, run_date, story_id, topic_id, category, title, status, error,
+                            publish_at, youtube_video_id, timestamp, gemini_tokens, tts_chars, images, upload_bytes)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        """,
+                        (run_id, report_data["run_date"], e["story_id"], e["topic_id"], categories.get(e["topic_id"]),
+                         e["title"], e["status"], e["error"], e["publish_at"], e["youtube_video_id"], e["timestamp"],
+                         u["gemini_tokens"], u["tts_chars"], u["images"], u["upload_bytes"])
+                    ).lastrowid
+                    conn.executemany(
+                        "INSERT INTO stages (video_id, name, count, wall, cpu, bytes, retries, units) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        [(video_id, name, t["count"], t["wall"], t["cpu"], t["bytes"], t["retries"], t["units"])
+                         for name, t in stages.items()]
+                    )
+        except sqlite3.Error as e:
+            logger.error(f"[History] Could not record run in {self.db_path}: {e}")
+
+    def cost(self, gemini_tokens=0, tts_chars=0, images=0, upload_bytes=0):
+        rates = self.rates
+        return (
+            gemini_tokens / 1e6 * float(rates.get("gemini_per_1m_tokens", 0))
+            + tts_chars / 1e3 * float(rates.get("elevenlabs_per_1k_chars", 0))
+            + images * float(rates.get("image", 0))
+            + upload_bytes / 1e9 * float(rates.get("upload_per_gb", 0))
+        )
+
+    def report(self, since, until):
+        """Success rate, stage latency percentiles and cost per video for run dates in [since, until]."""
+        window = {"since": since, "until": until}
+        with closing(self._connect()) as conn:
+            runs = conn.execute(
+                "SELECT COUNT(*) AS n, COALESCE(SUM(shared_tokens), 0) AS shared FROM runs WHERE run_date BETWEEN :since AND :until",
+                window
+            ).fetchone()
+            # A story's last entry in the window is its outcome
+            outcomes = conn.execute(
+                """
+                SELECT status, COUNT(*) AS n FROM videos
+                WHERE id IN (SELECT MAX(id) FROM videos WHERE run_date BETWEEN :since AND :until GROUP BY story_id)
+                GROUP BY status
+                """,
+                window
+            ).fetchall()
+            usage = conn.execute(
+                """
+                SELECT COALESCE(SUM(gemini_tokens), 0) AS gemini_tokens, COALESCE(SUM(tts_chars), 0) AS tts_chars,
+                       COALESCE(SUM(images), 0) AS images, COALESCE(SUM(upload_bytes), 0) AS upload_bytes
+                FROM videos WHERE run_date BETWEEN :since AND :until
+                """,
+                window
+            ).fetchone()
+            stage_walls = {}
+            for row in conn.execute(
+                """
+                SELECT s.name, s.wall FROM stages s JOIN videos v ON v.id = s.video_id
+                WHERE v.run_date BETWEEN :since AND :until ORDER BY s.name, s.wall
+                """,
+                window
+            ):
+                stage_walls.setdefault(row["name"], []).append(row["wall"])
+
+        statuses = {row["status"]: row["n"] for row in outcomes}
+        finished = statuses.get("SUCCESS", 0) + statuses.get("FAILED", 0)
+        total_cost = self.cost(usage["gemini_tokens"] + runs["shared"], usage["tts_chars"], usage["images"], usage["upload_bytes"])
+        return {
+            "since": since,
+            "until": until,
+            "runs": runs["n"],
+            "stories": sum(statuses.values()),
+            "statuses": statuses,
+            "success_rate": statuses.get("SUCCESS", 0) / finished if finished else None,
+            "total_cost": total_cost,
+            "cost_per_video": total_cost / statuses["SUCCESS"] if statuses.get("SUCCESS") else None,
+            "stages": {
+                name: {"count": len(walls), "p50": percentile(walls, 50), "p90": percentile(walls, 90),
+                       "p99": percentile(walls, 99), "max": walls[-1]}
+                for name, walls in stage_walls.items()
+            },
+        }
+
+
+def format_report(r):
+    rate = f"{r['success_rate'] * 100:.1f}%" if r["success_rate"] is not None else "n/a"
+    per_video = f"${r['cost_per_video']:.4f}" if r["cost_per_video"] is not None else "n/a"
+    statuses = ", ".join(f"{status} {n}" for status, n in sorted(r["statuses"].items())) or "none"
+    lines = [
+        f"Runs {r['since']} .. {r['until']}: {r['runs']} runs, {r['stories']} stories ({statuses})",
+        f"Success rate: {rate} of finished stories",
+        f"Cost: ${r['total_cost']:.4f} total, {per_video} per uploaded video (COST_RATES)",
+        "",
+        f"{'stage':<16} {'count':>6} {'p50 s':>9} {'p90 s':>9} {'p99 s':>9} {'max s':>9}",
+    ]
+    pipeline_stages = ("script", "media", "render", "upload")
+    order = sorted(r["stages"], key=lambda name: (name not in pipeline_stages, -r["stages"][name]["p50"]))
+    for name in order:
+        s = r["stages"][name]
+        lines.append(f"{name:<16} {s['count']:>6} {s['p50']:>9.2f} {s['p90']:>9.2f} {s['p99']:>9.2f} {s['max']:>9.2f}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the run history (state/history.db)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    report_p = sub.add_parser("report", help="Success rate, stage latency percentiles and cost per video")
+    report_p.add_argument("--since", default=None, help="First run date, YYYY-MM-DD (default: --days ago)")
+    report_p.add_argument("--until", default=None, help="Last run date, YYYY-MM-DD (default: today)")
+    report_p.add_argument("--days", type=int, default=30, help="Window length when --since is not given")
+    args = parser.parse_args()
+
+    if args.command == "report":
+        until = args.until or date.today().isoformat()
+        since = args.since or (date.fromisoformat(until) - timedelta(days=args.days - 1)).isoformat()
+        print(format_report(run_history.report(since, until)))
+
+
+run_history = RunHistory()
+
+if __name__ == "__main__":
+    main()
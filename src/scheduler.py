@@ -0,0 +1,106 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from src.config_loader import config
+from src.logger import logger
+from src.video_ffmpeg import video_editor
+
+
+class StoryScheduler:
+    """
+    Runs many stories through the pipeline stages at once.
+
+    Every stage gets its own worker pool and a story moves to the next pool as
+    soon as its current stage finishes, so story N+1 can be scripted while story N
+    renders and story N-1 uploads. Network stages (script, media, upload) use
+    plain thread workers. The render stage spends its time inside the FFmpeg
+    child process, so its thread slots are really process slots and are capped
+    at the core count.
+    """
+
+    DEFAULT_WORKERS = {
+        "script": 1,   # Gemini is quota bound, keep requests in order
+        "media": 2,    # ElevenLabs + image worker (each story fans out further)
+        "render": None,  # None = one FFmpeg process per core
+        "upload": 1,   # only queues the video; the upload queue's thread uploads
+    }
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.workers = self._load_worker_counts()
+
+        self._executors = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._all_done = threading.Event()
+
+    def _load_worker_counts(self):
+        cores = os.cpu_count() or 1
+        configured = config.settings.get("SCHEDULER_WORKERS") or {}
+
+        workers = {}
+        for stage in self.pipeline.STAGES:
+            count = configured.get(stage, self.DEFAULT_WORKERS.get(stage)) or cores
+            workers[stage] = max(1, int(count))
+
+        # FFmpeg encodes are CPU bound: never run more of them than we have cores
+        workers["render"] = min(workers["render"], cores)
+        return workers
+
+    def run(self, jobs):
+        """
+        jobs: StoryJob list from pipeline.create_job().
+        Blocks until every story has finished or failed.
+        """
+        if not jobs:
+            return
+
+        logger.info(f"Scheduler workers per stage: {self.workers}")
+        # Each of the renders that can overlap gets an equal share of the cores for its segment encodes
+        previous_slots = video_editor.render_slots
+        video_editor.render_slots = min(self.workers["render"], len(jobs))
+        self._executors = {
+            stage: ThreadPoolExecutor(max_workers=count, thread_name_prefix=f"stage-{stage}")
+            for stage, count in self.workers.items()
+        }
+        self._pending = len(jobs)
+        self._all_done.clear()
+
+        try:
+            for job in jobs:
+                logger.info(f"Starting pipeline for {job.story_id}")
+                self._submit(job, 0)
+
+            self._all_done.wait()
+        finally:
+            for executor in self._executors.values():
+                executor.shutdown(wait=True)
+            self._executors = {}
+            video_editor.render_slots = previous_slots
+
+    def _submit(self, job, stage_idx):
+        if stage_idx >= len(self.pipeline.STAGES):
+            self._finish(job)
+            return
+
+        stage = self.pipeline.STAGES[stage_idx]
+        future = self._executors[stage].submit(self.pipeline.run_stage, stage, job)
+        future.add_done_callback(lambda f: self._on_stage_done(job, stage_idx, f))
+
+    def _on_stage_done(self, job, stage_idx, future):
+        try:
+            ok = future.result()
+        except Exception as e:
+            logger.error(f"Critical error processing topic {job.topic_id}: {e}")
+            ok = False
+
+        if ok:
+            self._submit(job, stage_idx + 1)
+        else:
+            self._finish(job)
+
+    def _finish(self, job):
+        with self._lock:
+            self._pending -= 1
+            if self._pending == 0:
+                self._all_done.set()
@@ -0,0 +1,131 @@
+import os
+import textwrap
+import threading
+from functools import cached_property, lru_cache
+from src.cache import artifact_cache
+from src.config_loader import config
+from src.logger import logger
+from src.tracing import tracer
+
+
+@lru_cache(maxsize=16)
+def load_font(font_path, font_size):
+    """
+    Loads a TrueType font once per (path, size). Falls back to PIL's default
+    font (which will not render Nepali correctly) when the file is missing.
+    """
+    from PIL import ImageFont
+    if os.path.exists(font_path):
+        try:
+            return ImageFont.truetype(font_path, font_size)
+        except OSError as e:
+            logger.warning(f"Could not load font {font_path}: {e}")
+    return ImageFont.load_default()
+
+
+class TextOverlayRenderer:
+    """
+    Renders scene captions as transparent PNGs cropped to the text block.
+
+    Overlays are content-addressed (text + font + layout) and kept in the
+    artifact cache, so identical captions are rendered once and reused across
+    scenes and stories. render() returns the position at which FFmpeg should
+    overlay the image on the 1080x1920 frame.
+    """
+
+    # Bump when the drawing code changes so stale cached overlays are not reused
+    STYLE_VERSION = 1
+
+    def __init__(self):
+        self.width = 1080
+        self.height = 1920
+        self.font_size = 60
+        self.line_height = 70
+        self.wrap_width = 30
+        self.stroke_width = 3 + 4  # Thick black outline
+
+        self._lock = threading.Lock()  # PIL font rendering is not safe across render threads
+        self._layouts = {}
+
+    @cached_property
+    def font_path(self):
+        return str(config.root_dir / config.settings.get("FONT_PATH", "assets/fonts/NotoSansDevanagari-Bold.ttf"))
+
+    def render(self, text):
+        """
+        Returns (png_path, x, y) for the caption overlay.
+        """
+        key = artifact_cache.make_key(
+            "overlay", self.STYLE_VERSION, text, self.font_path, self.font_size, self.width, self.height
+        )
+        with self._lock:
+            cached = self._layouts.get(key)
+            if cached and os.path.exists(cached[0]):
+                return cached
+
+            font = load_font(self.font_path, self.font_size)
+            lines, box = self._layout(text, font)
+            path = artifact_cache.path_for("overlays", key, ".png")
+
+            if not path.exists():
+                with tracer.span("overlay"):
+                    self._draw(lines, box, font, path)
+
+            result = (str(path), box[0], box[1])
+            self._layouts[key] = result
+            return result
+
+    def _layout(self, text, font):
+        """
+        Positions each wrapped line exactly as on the old full-frame canvas and
+        returns ([(line, x, y)], bounding box of the stroked text).
+        """
+        from PIL import Image, ImageDraw
+        measure = ImageDraw.Draw(Image.new('RGBA', (1, 1)))
+
+        # Text wrapping
+        lines = textwrap.wrap(text, width=self.wrap_width)
+
+        # Draw text at bottom center
+        y_text = self.height - 400 - (len(lines) * self.line_height)
+
+        placed = []
+        left, top, right, bottom = self.width, self.height, 0, 0
+        for line in lines:
+            bbox = measure.textbbox((0, 0), line, font=font)
+            text_width = bbox[2] - bbox[0]
+            x_text = (self.width - text_width) / 2
+            placed.append((line, x_text, y_text))
+
+            l, t, r, b = measure.textbbox((x_text, y_text), line, font=font, stroke_width=self.stroke_width)
+            left, top = min(left, l), min(top, t)
+            right, bottom = max(right, r), max(bottom, b)
+
+            y_text += self.line_height  # line height
+
+        if not placed:
+            return [], (0, 0, 1, 1)
+
+        # Whole pixels keep the glyph offsets identical to the full-frame render
+        left, top = max(0, int(left)), max(0, int(top))
+        right, bottom = min(self.width, int(right) + 1), min(self.height, int(bottom) + 1)
+        return placed, (left, top, right, bottom)
+
+    def _draw(self, lines, box, font, path):
+        from PIL import Image, ImageDraw
+        left, top, right, bottom = box
+        img = Image.new('RGBA', (right - left, bottom - top), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(img)
+
+        for line, x_text, y_text in lines:
+            xy = (x_text - left, y_text - top)
+            draw.text(xy, line, font=font, fill="black", stroke_width=self.stroke_width, stroke_fill="black")
+            draw.text(xy, line, font=font, fill="yellow", stroke_width=0)  # Main text
+
+        # Write then rename: another story may be reading the same overlay
+        tmp_path = path.with_name(f".tmp_{threading.get_ident()}_{path.name}")
+        img.save(tmp_path, format="PNG")
+        os.replace(tmp_path, path)
+
+
+overlay_renderer = TextOverlayRenderer()
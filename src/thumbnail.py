@@ -1,7 +1,7 @@
-from PIL import Image, ImageDraw, ImageFont
 import os
 from src.logger import logger
 from src.config_loader import config
+from src.text_overlay import load_font
 
 class ThumbnailGenerator:
     def __init__(self):
@@ -11,6 +11,7 @@ class ThumbnailGenerator:
         """
         Creates a thumbnail by loading an image and adding text.
         """
+        from PIL import Image, ImageDraw
         try:
             img = Image.open(image_path)
             draw = ImageDraw.Draw(img)
@@ -31,10 +32,7 @@ class ThumbnailGenerator:
             
             if os.path.exists(font_path):
                 font_size = 100
-                try:
-                    font = ImageFont.truetype(str(font_path), font_size)
-                except:
-                    font = ImageFont.load_default()
+                font = load_font(str(font_path), font_size)
 
                 # Text positioning (Centered, middle-bottom)
                 # This is a simplification. 
@@ -0,0 +1,176 @@
+import hashlib
+import json
+import sqlite3
+import threading
+from contextlib import closing
+from datetime import datetime, timedelta
+from functools import cached_property
+from src.config_loader import config
+from src.logger import logger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS topics (
+    id TEXT PRIMARY KEY,
+    category TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    active INTEGER NOT NULL DEFAULT 1,
+    use_count INTEGER NOT NULL DEFAULT 0,
+    last_used TEXT,
+    last_outcome TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_topics_category_lru ON topics (active, category, last_used, position);
+CREATE INDEX IF NOT EXISTS idx_topics_outcome ON topics (last_outcome, last_used);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# A topic counts as failed (and is skipped) until the cooldown has passed
+ELIGIBLE = "active = 1 AND NOT (last_outcome IS 'FAILED' AND last_used > :cutoff)"
+
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+class TopicStore:
+    """
+    Topics with their usage history in SQLite (state/topics.db).
+
+    topics.json is only parsed when its contents change (its bytes are
+    hashed, since a fresh checkout resets mtimes); new topics are added,
+    edited ones updated and removed ones deactivated, keeping their history. Selection is least recently used: first the category used least
+    recently, then that category's least recently used topic, with failed
+    topics skipped for TOPIC_FAILED_COOLDOWN_DAYS. Every change is one
+    transaction, so the file is never left half written.
+    """
+
+    def __init__(self):
+        self.db_path = config.state_dir / "topics.db"
+        self.topics_path = config.config_dir / "topics.json"
+        self.state_file = config.state_dir / "state.json"
+        self._lock = threading.Lock()
+
+    @cached_property
+    def failed_cooldown_days(self):
+        return float(config.settings.get("TOPIC_FAILED_COOLDOWN_DAYS", 7))
+
+    def _connect(self):
+        self.db_path.parent.mkdir(exist_ok=True)
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def sync(self):
+        """Brings the store up to date with topics.json if the file changed."""
+        fingerprint = hashlib.sha256(self.topics_path.read_bytes()).hexdigest()
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.executescript(SCHEMA)
+            row = conn.execute("SELECT value FROM meta WHERE key = 'topics_fingerprint'").fetchone()
+            if row and row["value"] == fingerprint:
+                return
+
+            seeding = conn.execute("SELECT COUNT(*) FROM topics").fetchone()[0] == 0
+            topics = config.get_topics()
+            conn.execute("UPDATE topics SET active = 0")
+            conn.executemany(
+                """
+                INSERT INTO topics (id, category, position, payload, active) VALUES (?, ?, ?, ?, 1)
+                ON CONFLICT(id) DO UPDATE SET
+                    category = excluded.category, position = excluded.position,
+                    payload = excluded.payload, active = 1
+                """,
+                [(t["id"], t.get("category", ""), i, json.dumps(t, ensure_ascii=False)) for i, t in enumerate(topics)]
+            )
+            if seeding:
+                self._seed_from_state(conn)
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('topics_fingerprint', ?)", (fingerprint,)
+            )
+            logger.info(f"[Topics] Synced {len(topics)} topics into {self.db_path.name}")
+
+    def _seed_from_state(self, conn):
+        # Topics the old rotation already used (up to state.json's last_index)
+        # start as used, oldest first, so the first picks continue where it stopped
+        if not self.state_file.exists():
+            return
+        with open(self.state_file, "r") as f:
+            last_index = json.load(f).get("last_index", -1)
+        epoch = datetime(2000, 1, 1)
+        conn.executemany(
+            "UPDATE topics SET use_count = 1, last_used = ?, last_outcome = 'UNKNOWN' WHERE position = ?",
+            [((epoch + timedelta(seconds=i)).isoformat(timespec="seconds"), i) for i in range(last_index + 1)]
+        )
+        logger.info(f"[Topics] Seeded usage from state.json (last_index {last_index})")
+
+    def pick(self, count):
+        """
+        Picks and marks as used up to count topics, each from a different
+        category while categories last.
+        """
+        self.sync()
+        cutoff = (datetime.now() - timedelta(days=self.failed_cooldown_days)).isoformat(timespec="seconds")
+        picked = []
+        with self._lock, closing(self._connect()) as conn, conn:
+            while len(picked) < count:
+                row = self._pick_one(conn, cutoff, [t["id"] for t in picked])
+                if row is None:
+                    break
+                conn.execute(
+                    "UPDATE topics SET use_count = use_count + 1, last_used = ?, last_outcome = 'SELECTED' WHERE id = ?",
+                    (_now(), row["id"])
+                )
+                picked.append(json.loads(row["payload"]))
+        return picked
+
+    def _pick_one(self, conn, cutoff, exclude):
+        params = {"cutoff": cutoff, **{f"p{i}": topic_id for i, topic_id in enumerate(exclude)}}
+        not_picked = f"AND id NOT IN ({', '.join(f':p{i}' for i in range(len(exclude)))})" if exclude else ""
+        # Categories by most recent use; the ones picked this time were just
+        # used, so they sort last on their own
+        categories = conn.execute(
+            """
+            SELECT category FROM topics WHERE active = 1
+            GROUP BY category ORDER BY MAX(COALESCE(last_used, '')), MIN(position)
+            """
+        ).fetchall()
+        for category in categories:
+            # Never-used topics (NULL last_used) sort first
+            row = conn.execute(
+                f"""
+                SELECT id, payload FROM topics
+                WHERE {ELIGIBLE} AND category = :category {not_picked}
+                ORDER BY last_used, position LIMIT 1
+                """,
+                {**params, "category": category["category"]}
+            ).fetchone()
+            if row:
+                return row
+        return None
+
+    def categories(self, topic_ids):
+        """{topic_id: category} for the given ids that the store knows."""
+        topic_ids = list(topic_ids)
+        if not topic_ids or not self.db_path.exists():
+            return {}
+        try:
+            with closing(self._connect()) as conn:
+                rows = conn.execute(
+                    f"SELECT id, category FROM topics WHERE id IN ({','.join('?' * len(topic_ids))})", topic_ids
+                ).fetchall()
+        except sqlite3.Error:
+            return {}
+        return {row["id"]: row["category"] for row in rows}
+
+    def record_outcome(self, topic_id, outcome):
+        """Stores the final outcome (SUCCESS / FAILED) of the story made from topic_id."""
+        try:
+            with self._lock, closing(self._connect()) as conn, conn:
+                conn.execute("UPDATE topics SET last_outcome = ? WHERE id = ?", (outcome, topic_id))
+        except sqlite3.Error as e:
+            logger.warning(f"[Topics] Could not record outcome for {topic_id}: {e}")
+
+
+topic_store = TopicStore()
@@ -0,0 +1,169 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from functools import cached_property
+from src.config_loader import config
+from src.logger import logger
+
+
+class Span:
+    """
+    One timed piece of work. cpu is the CPU time of the thread that ran the
+    span; work done in child processes (FFmpeg) is added by the caller.
+    """
+
+    def __init__(self, name, story_id=None, parent=None, **attrs):
+        self.name = name
+        self.parent = parent
+        self.story_id = story_id or (parent.story_id if parent else None)
+        self.attrs = {}
+        self.bytes = 0
+        self.retries = 0
+        self.units = 0
+        self.child_cpu = 0.0
+        self.add(**attrs)
+        self.status = "ok"
+        self._start = time.time()
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+        self.wall = None
+        self.cpu = None
+
+    def add(self, bytes=0, retries=0, units=0, child_cpu=0.0, **attrs):
+        self.bytes += bytes
+        self.retries += retries
+        self.units += units
+        self.child_cpu += child_cpu
+        self.attrs.update(attrs)
+
+    def finish(self):
+        self.wall = time.perf_counter() - self._wall
+        self.cpu = time.thread_time() - self._cpu + self.child_cpu
+
+    def to_dict(self):
+        return {
+            "story_id": self.story_id,
+            "name": self.name,
+            "parent": self.parent.name if self.parent else None,
+            "start": datetime.fromtimestamp(self._start).isoformat(),
+            "wall": round(self.wall, 4),
+            "cpu": round(self.cpu, 4),
+            "bytes": self.bytes,
+            "retries": self.retries,
+            "units": self.units,
+            "status": self.status,
+            **self.attrs,
+        }
+
+
+class Tracer:
+    """
+    Records spans around pipeline stages and the calls inside them.
+
+    The open span is tracked per thread, so nested spans find their parent
+    (and story) on their own; work handed to another thread is linked with
+    wrap(). Finished spans are appended to TRACE_FILE as JSON lines tagged
+    with this process's run_id, so a later run (or a benchmark) never
+    truncates an earlier one's trace, and kept in memory for the report and
+    the --profile summary.
+    """
+
+    def __init__(self):
+        self.run_id = f"{datetime.now():%Y%m%dT%H%M%S}-{os.getpid()}"
+        self.records = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._file = None
+
+    @cached_property
+    def enabled(self):
+        return bool(config.settings.get("TRACE_ENABLED", True))
+
+    @cached_property
+    def trace_file(self):
+        return config.root_dir / config.settings.get("TRACE_FILE", "trace.jsonl")
+
+    def current(self):
+        stack = getattr(self._local, "stack", None)
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def span(self, name, story_id=None, parent=None, **attrs):
+        if not self.enabled:
+            yield Span(name, story_id, **attrs)
+            return
+
+        span = Span(name, story_id, parent or self.current(), **attrs)
+        stack = self._local.__dict__.setdefault("stack", [])
+        stack.append(span)
+        try:
+            yield span
+        except BaseException:
+            span.status = "error"
+            raise
+        finally:
+            stack.pop()
+            span.finish()
+            self._record(span.to_dict())
+
+    def add(self, **counters):
+        """Adds bytes/retries/units (or attributes) to the current span, if any."""
+        span = self.current()
+        if span:
+            span.add(**counters)
+
+    def wrap(self, fn, name, **attrs):
+        """fn run in a span that is a child of the span open here, from any thread."""
+        parent = self.current()
+
+        def traced(*args, **kwargs):
+            with self.span(name, parent=parent, **attrs):
+                return fn(*args, **kwargs)
+        return traced
+
+    def _record(self, record):
+        record["run_id"] = self.run_id
+        with self._lock:
+            self.records.append(record)
+            try:
+                if self._file is None:
+                    self._file = open(self.trace_file, "a", encoding="utf-8")
+                self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                self._file.flush()
+            except OSError as e:
+                logger.warning(f"[Trace] Could not write {self.trace_file}: {e}")
+
+    def snapshot(self):
+        """Copy of the finished span records so far."""
+        with self._lock:
+            return list(self.records)
+
+    def summary(self, story_id=None):
+        """Totals per span name: {name: {count, wall, cpu, bytes, retries, units}}."""
+        records = [r for r in self.snapshot() if story_id is None or r["story_id"] == story_id]
+        totals = {}
+        for r in records:
+            t = totals.setdefault(r["name"], {"count": 0, "wall": 0.0, "cpu": 0.0, "bytes": 0, "retries": 0, "units": 0})
+            t["count"] += 1
+            for field in ("wall", "cpu", "bytes", "retries", "units"):
+                t[field] += r[field]
+        for t in totals.values():
+            t["wall"] = round(t["wall"], 3)
+            t["cpu"] = round(t["cpu"], 3)
+        return totals
+
+    def format_summary(self):
+        totals = self.summary()
+        lines = [f"{'span':<16} {'count':>5} {'wall s':>9} {'avg s':>8} {'cpu s':>8} {'MB':>8} {'retries':>7}"]
+        for name, t in sorted(totals.items(), key=lambda item: -item[1]["wall"]):
+            lines.append(
+                f"{name:<16} {t['count']:>5} {t['wall']:>9.2f} {t['wall'] / t['count']:>8.2f} "
+                f"{t['cpu']:>8.2f} {t['bytes'] / 1e6:>8.2f} {t['retries']:>7}"
+            )
+        return "\n".join(lines)
+
+
+tracer = Tracer()
@@ -0,0 +1,189 @@
+import atexit
+import json
+import os
+import queue
+import tempfile
+import threading
+from datetime import datetime
+from functools import cached_property
+from src.config_loader import config
+from src.logger import logger
+from src.youtube_upload import youtube_uploader
+from src.report import report_manager
+from src.checkpoint import checkpoint_store
+from src.tracing import tracer
+from src.topic_store import topic_store
+from src.utils_time import revalidate_publish_iso
+
+
+class UploadQueue:
+    """
+    Rendered videos waiting for YouTube, persisted in state/upload_queue.json.
+
+    The render stage only adds an entry; one background thread uploads while
+    the next stories render, so network time overlaps with FFmpeg time. The
+    thread is alone because the YouTube client is not thread safe. An upload
+    that fails stays in the file and is retried by the next run (its publish
+    time re-checked first), up to UPLOAD_MAX_ATTEMPTS runs, so a failed
+    upload never costs a re-render. An entry whose video file is gone (outputs/
+    is not kept between CI runs) goes back to its checkpoint for --resume to
+    render again.
+    """
+
+    def __init__(self):
+        self.path = config.state_dir / "upload_queue.json"
+        self._entries = {}  # story_id -> entry, mirrors the file
+        self._todo = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        # Drain before exit even if close() is never called; a no-op if never started
+        atexit.register(self.close)
+
+    @cached_property
+    def max_attempts(self):
+        return int(config.settings.get("UPLOAD_MAX_ATTEMPTS", 5))
+
+    def start(self):
+        """Loads entries left by earlier runs and starts the uploader thread."""
+        with self._lock:
+            if self._thread:
+                return
+            self._entries = self._load()
+            # Before main() reads checkpoint_store.pending(), so this run can resume them
+            sent_back = [
+                entry["story_id"] for entry in self._entries.values()
+                if not os.path.exists(entry["video_path"]) and self._send_back(entry)
+            ]
+            for story_id in sent_back:
+                del self._entries[story_id]
+            if sent_back:
+                self._save()
+            for story_id in self._entries:
+                logger.info(f"[Upload Queue] {story_id} left by an earlier run, retrying")
+                self._todo.put(story_id)
+            self._thread = threading.Thread(target=self._run, name="uploader", daemon=True)
+            self._thread.start()
+
+    def put(self, job, description, tags, publish_at):
+        entry = {
+            "story_id": job.story_id,
+            "topic_id": job.topic_id,
+            "title": job.title,
+            "video_path": str(job.video_path),
+            "description": description,
+            "tags": tags,
+            "publish_at": publish_at,
+            "attempts": 0,
+            "last_error": None,
+            "queued_at": datetime.now().isoformat(),
+        }
+        self.start()
+        with self._lock:
+            self._entries[job.story_id] = entry
+            self._save()
+        self._todo.put(job.story_id)
+        logger.info(f"[Upload Queue] {job.story_id} queued ({self._todo.qsize()} waiting)")
+
+    def close(self):
+        """Blocks until every queued upload has been attempted once."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread:
+            self._todo.put(None)
+            thread.join()
+
+    def _run(self):
+        while True:
+            story_id = self._todo.get()
+            if story_id is None:
+                return
+            with self._lock:
+                entry = self._entries.get(story_id)
+            if entry is None:
+                continue  # queued twice and already handled
+            try:
+                self._upload(dict(entry))
+            except Exception as e:
+                logger.error(f"[Upload Queue] {story_id}: unexpected error: {e}")
+
+    def _upload(self, entry):
+        story_id = entry["story_id"]
+        if not os.path.exists(entry["video_path"]):
+            if self._send_back(entry):
+                with self._lock:
+                    self._entries.pop(story_id, None)
+                    self._save()
+            else:
+                self._drop(entry, "FAILED", None, f"Video file missing: {entry['video_path']}")
+            return
+
+        publish_at = revalidate_publish_iso(entry["publish_at"])
+        if publish_at != entry["publish_at"]:
+            logger.info(f"[Upload Queue] {story_id}: publish time {entry['publish_at']} has passed, using {publish_at}")
+
+        with tracer.span("youtube_upload", story_id=story_id, bytes=os.path.getsize(entry["video_path"])) as span:
+            video_id = youtube_uploader.upload_video(
+                entry["video_path"], entry["title"], entry["description"], entry["tags"], publish_at
+            )
+            if not video_id:
+                span.status = "failed"
+
+        if video_id:
+            self._drop(entry, "SUCCESS", video_id, publish_at=publish_at)
+            checkpoint = checkpoint_store.load(story_id)
+            if checkpoint:
+                checkpoint.mark_done("upload", data={"video_id": video_id})
+                checkpoint.mark_complete()
+            return
+
+        attempts = entry["attempts"] + 1
+        if attempts >= self.max_attempts:
+            self._drop(entry, "FAILED", None, f"Upload failed {attempts} times")
+            return
+
+        with self._lock:
+            current = self._entries[story_id]
+            current["attempts"] = attempts
+            current["last_error"] = "Upload failed"
+            self._save()
+        logger.warning(f"[Upload Queue] {story_id}: upload failed, kept for the next run ({attempts}/{self.max_attempts})")
+        report_manager.add_entry(story_id, entry["topic_id"], entry["title"], entry["publish_at"], None, "QUEUED", "Upload failed")
+
+    def _send_back(self, entry):
+        """Reopens render and upload in the manifest of a story whose video is gone; False without one."""
+        checkpoint = checkpoint_store.load(entry["story_id"])
+        if checkpoint is None:
+            return False
+        logger.warning(f"[Upload Queue] {entry['story_id']}: video file missing, back to render for --resume")
+        checkpoint.reopen("render", "upload")
+        return True
+
+    def _drop(self, entry, status, video_id, error=None, publish_at=None):
+        with self._lock:
+            self._entries.pop(entry["story_id"], None)
+            self._save()
+        report_manager.add_entry(
+            entry["story_id"], entry["topic_id"], entry["title"], publish_at or entry["publish_at"], video_id, status, error
+        )
+        topic_store.record_outcome(entry["topic_id"], status)
+
+    def _load(self):
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return {entry["story_id"]: entry for entry in json.load(f)}
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"[Upload Queue] Unreadable {self.path}, starting empty: {e}")
+            return {}
+
+    def _save(self):
+        # Write then rename, like the checkpoint manifests
+        self.path.parent.mkdir(exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=".tmp_")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(list(self._entries.values()), f, indent=2, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+
+upload_queue = UploadQueue()
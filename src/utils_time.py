@@ -31,6 +31,18 @@ def validate_schedule_time(npt_dt):
         return now + datetime.timedelta(minutes=20)
     return npt_dt
 
+def revalidate_publish_iso(utc_iso, min_lead_minutes=15):
+    """
+    Re-checks a UTC ISO publish time chosen earlier (e.g. a video that waited
+    in the upload queue). If it has passed or is less than min_lead_minutes
+    away, it is pushed to 20 mins from now, like validate_schedule_time.
+    """
+    utc_dt = UTC_TIMEZONE.localize(datetime.datetime.strptime(utc_iso, '%Y-%m-%dT%H:%M:%S.%fZ'))
+    now = get_current_npt_time()
+    if utc_dt <= now + datetime.timedelta(minutes=min_lead_minutes):
+        return npt_to_utc_iso(now + datetime.timedelta(minutes=20))
+    return utc_iso
+
 def get_three_daily_schedules():
     """
     NEW: Generates 3 specific UTC ISO strings based on the Nepal Weekly Cycle.
@@ -1,91 +1,100 @@
-import subprocess
 import os
-from PIL import Image, ImageDraw, ImageFont
-import textwrap
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
 from src.logger import logger
 from src.config_loader import config
+from src.text_overlay import overlay_renderer
+from src.tracing import tracer
+from src.ffmpeg_runner import ffmpeg_runner, FFmpegError
 
 class VideoEditor:
+    # Ken Burns implementations, both producing the same centered zoom (0.0015/frame, max 1.5x):
+    #   zoompan       - original graph: image looped at 25 fps, 2x upscale, zoompan
+    #   zoompan_once  - same graph, but the still is decoded and upscaled once and
+    #                   zoompan emits every frame from it (identical frames, ~15% less
+    #                   encode time per output second in benchmarks.bench_motion)
+    MOTION_ENGINES = ("zoompan", "zoompan_once")
+
+    # libx264/AAC encoder profiles; ENCODER_PROFILES in settings.yaml overrides fields per name.
+    # "standard" reproduces the historic command (x264 defaults: medium, CRF 23, keyint 250; AAC 192k).
+    DEFAULT_ENCODER_PROFILES = {
+        "draft": {"preset": "veryfast", "crf": 28, "tune": None, "threads": 0, "gop": 50, "audio_bitrate": "128k"},
+        "standard": {"preset": "medium", "crf": 23, "tune": None, "threads": 0, "gop": 250, "audio_bitrate": "192k"},
+        "archive": {"preset": "slow", "crf": 18, "tune": "film", "threads": 0, "gop": 250, "audio_bitrate": "256k"},
+    }
+
     def __init__(self):
         self.width = 1080
         self.height = 1920
-        # Font for text overlays
-        self.font_path = str(
-            config.root_dir / config.settings.get("FONT_PATH", "assets/fonts/NotoSansDevanagari-Bold.ttf")
-        )
+        self.fps = 25  # zoompan's default output rate, which the whole graph runs at
+        # Renders running at once (set by StoryScheduler); segments mode shares the cores between them
+        self.render_slots = 1
 
         # ✅ Background music directory (your new location)
         # Stored inside src/background_music/
         self.bgm_dir = config.root_dir / "src" / "background_music"
 
-    def create_text_overlay(self, text, output_path, duration):
-        """
-        Creates a transparent PNG with the text to overlay.
-        Better than FFmpeg drawtext for handling complex scripts like Nepali.
-        """
-        img = Image.new('RGBA', (self.width, self.height), (0, 0, 0, 0))
-        draw = ImageDraw.Draw(img)
-
-        if os.path.exists(self.font_path):
-            font_size = 60
-            font = ImageFont.truetype(self.font_path, font_size)
-        else:
-            # Fallback (will likely fail to render Nepali correctly, using standard)
-            font = ImageFont.load_default()
-
-        # Text wrapping
-        lines = textwrap.wrap(text, width=30)  # Adjust width based on needs
-
-        # Draw text at bottom center
-        y_text = self.height - 400 - (len(lines) * 70)
-
-        for line in lines:
-            # Calculate text width (getbbox)
-            bbox = draw.textbbox((0, 0), line, font=font)
-            text_width = bbox[2] - bbox[0]
-            x_text = (self.width - text_width) / 2
-
-            # Simple shadow/stroke
-            stroke_width = 3
-            draw.text(
-                (x_text, y_text),
-                line,
-                font=font,
-                fill="black",
-                stroke_width=stroke_width + 4,
-                stroke_fill="black",
-            )  # Thick outline
-            draw.text((x_text, y_text), line, font=font, fill="yellow", stroke_width=0)  # Main text
-
-            y_text += 70  # line height
-
-        img.save(output_path)
+    # Settings below are read on the first render, not at import
+    @cached_property
+    def motion_engine(self):
+        engine = config.settings.get("MOTION_ENGINE", "zoompan")
+        if engine not in self.MOTION_ENGINES:
+            logger.warning(f"Unknown MOTION_ENGINE '{engine}', using zoompan")
+            engine = "zoompan"
+        return engine
+
+    @cached_property
+    def encoder_profiles(self):
+        return self._load_encoder_profiles()
+
+    @cached_property
+    def encoder_profile(self):
+        profile = config.settings.get("ENCODER_PROFILE", "standard")
+        if profile not in self.encoder_profiles:
+            logger.warning(f"Unknown ENCODER_PROFILE '{profile}', using standard")
+            profile = "standard"
+        return profile
+
+    # single = one FFmpeg process for the whole video, segments = per-scene parallel encodes,
+    # sequential = per-scene encodes one at a time (memory stays at one scene's worth)
+    @cached_property
+    def encode_mode(self):
+        return config.settings.get("ENCODE_MODE", "single")
+
+    @cached_property
+    def encode_workers(self):
+        return int(config.settings.get("ENCODE_WORKERS", 0))  # 0 = one per core
+
+    # single mode holds every scene's inputs at once; from this many scenes on, go sequential
+    @cached_property
+    def sequential_scenes(self):
+        return int(config.settings.get("ENCODE_SEQUENTIAL_SCENES", 10))  # 0 = never
 
     def assemble_video(self, scenes, audio_path, output_path, temp_dir, category=None):
         """
         Assembles video from scenes (images) and audio.
-        scenes: list of dicts with 'image_path', 'text', 'duration'
+        scenes: list of dicts with 'image_path', 'text', 'duration' (the timing plan
+        from SceneAligner: whole-frame durations summing to the narration length)
 
         ✅ Change: background music is chosen by category from src/background_music/<category>.mp3
+        ENCODE_MODE=segments renders each scene in its own FFmpeg process instead,
+        ENCODE_MODE=sequential does the same one scene at a time.
         """
+        mode = self.encode_mode
+        if mode == "single" and self.sequential_scenes and len(scenes) >= self.sequential_scenes:
+            logger.info(f"{len(scenes)} scenes: encoding sequentially to keep memory bounded")
+            mode = "sequential"
+        if mode in ("segments", "sequential"):
+            workers = 1 if mode == "sequential" else None
+            return self._assemble_segments(scenes, audio_path, output_path, temp_dir, category, workers)
+
         # 1. Generate text overlay images for each scene
         inputs = []
         filter_complex = []
 
-        # Input 0: Narration Audio
-        inputs.append("-i")
-        inputs.append(audio_path)
-
-        # ✅ Add background music by category (Input 1)
-        bgm_path = self._get_bgm_for_category(category)
-        has_bgm = False
-        if bgm_path:
-            inputs.append("-i")
-            inputs.append(bgm_path)
-            has_bgm = True
-            logger.info(f"Selected BGM for category='{category}': {bgm_path}")
-        else:
-            logger.warning(f"No BGM found for category='{category}'. Proceeding without BGM.")
+        # Input 0: Narration Audio (+ Input 1: BGM by category)
+        audio_inputs, has_bgm = self._audio_inputs(audio_path, category)
+        inputs.extend(audio_inputs)
 
         video_streams = []
         current_input_idx = 2 if has_bgm else 1
@@ -98,47 +107,26 @@ class VideoEditor:
             duration = scene['duration']
             total_duration += duration
 
-            # Create text overlay image
-            text_overlay_path = os.path.join(temp_dir, f"text_{idx}.png")
-            self.create_text_overlay(text, text_overlay_path, duration)
+            # Text overlay image (cropped to the text, shared across identical captions)
+            text_overlay_path, text_x, text_y = overlay_renderer.render(text)
 
             # Add inputs
-            inputs.extend(["-loop", "1", "-t", str(duration), "-i", image_path])
+            inputs.extend(self._motion_input_args(image_path, duration))
             inputs.extend(["-loop", "1", "-t", str(duration), "-i", text_overlay_path])
 
             img_idx = current_input_idx
             text_idx = current_input_idx + 1
             current_input_idx += 2
 
-            frames = int(duration * 30)
-
-            # Apply zoompan to image
-            filter_complex.append(
-                f"[{img_idx}:v]scale=1080*2:-1,"
-                f"zoompan=z='min(zoom+0.0015,1.5)':d={frames}:"
-                f"x='iw/2-(iw/zoom/2)':y='ih/2-(ih/zoom/2)':s=1080x1920,"
-                f"setsar=1[v{idx}_zoom]"
-            )
-
-            # Overlay text on top of zoomed image
-            filter_complex.append(f"[{text_idx}:v]scale=1080:1920[v{idx}_text]")
-            filter_complex.append(f"[v{idx}_zoom][v{idx}_text]overlay=0:0:shortest=1[v{idx}_out]")
-
+            filter_complex.extend(self._scene_filter(img_idx, text_idx, idx, duration, (text_x, text_y)))
             video_streams.append(f"[v{idx}_out]")
 
         # Concatenate all video segments
         filter_complex.append(f"{''.join(video_streams)}concat=n={len(scenes)}:v=1:a=0[v_final]")
 
         # Audio Mixing
-        # Ensure narration is louder than BGM
-        if has_bgm:
-            # BGM is input 1, narration is input 0
-            # Loop bgm indefinitely; final output uses -shortest to end when narration ends.
-            filter_complex.append(f"[1:a]volume=0.1,aloop=loop=-1:size=2e+09[bgm_loop]")
-            filter_complex.append(f"[0:a][bgm_loop]amix=inputs=2:duration=first:dropout_transition=2[a_final]")
-            map_audio = "[a_final]"
-        else:
-            map_audio = "0:a"
+        audio_filters, map_audio = self._audio_mix_filter(0, 1 if has_bgm else None)
+        filter_complex.extend(audio_filters)
 
         cmd = (
             ["ffmpeg", "-y"]
@@ -150,14 +138,11 @@ class VideoEditor:
                 "[v_final]",
                 "-map",
                 map_audio,
-                "-c:v",
-                "libx264",
-                "-pix_fmt",
-                "yuv420p",
-                "-c:a",
-                "aac",
-                "-b:a",
-                "192k",
+            ]
+            + self._video_codec_args()
+            + self._audio_codec_args()
+            + self._container_args()
+            + [
                 "-shortest",
                 output_path,
             ]
@@ -166,13 +151,220 @@ class VideoEditor:
         logger.info("Running FFmpeg...")
 
         try:
-            subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            with tracer.span("encode", units=round(total_duration, 2), scenes=len(scenes)):
+                ffmpeg_runner.run(cmd, "FFmpeg encode", expected_sec=total_duration)
             logger.info(f"Video assembled at {output_path}")
             return True
-        except subprocess.CalledProcessError as e:
-            logger.error(f"FFmpeg failed: {e.stderr.decode()}")
+        except FFmpegError as e:
+            logger.error(f"FFmpeg failed: {e}")
+            return False
+
+    def _assemble_segments(self, scenes, audio_path, output_path, temp_dir, category=None, workers=None):
+        """
+        Renders every scene (image + zoom + text) to its own segment in parallel
+        FFmpeg processes, then joins them with the concat demuxer and muxes the
+        narration/BGM mix without re-encoding the video. With workers=1 only one
+        scene is decoded at a time, so peak memory does not grow with the scene count.
+
+        A scene that fails twice is dropped and its time is given to the nearest
+        rendered neighbour, so one bad scene no longer fails the whole video.
+        """
+        file_prefix = os.path.splitext(os.path.basename(output_path))[0]
+        durations = [float(s['duration']) for s in scenes]
+        seg_paths = [os.path.join(temp_dir, f"{file_prefix}_seg_{idx}.mp4") for idx in range(len(scenes))]
+        peak_rss = []
+
+        def render(idx):
+            tracer.add(units=round(durations[idx], 2), scene=idx)
+            for attempt in (1, 2):
+                stats = self._render_segment(scenes[idx], idx, durations[idx], seg_paths[idx])
+                if stats:
+                    peak_rss.append(stats.get("peak_rss_mb") or 0)
+                    return True
+                logger.warning(f"Segment {idx} failed (attempt {attempt}/2)")
+                tracer.add(retries=1)
+            return False
+        render = tracer.wrap(render, "encode_segment")
+
+        workers = workers or self.encode_workers or max(1, (os.cpu_count() or 1) // self.render_slots)
+        logger.info(f"Rendering {len(scenes)} segments with {workers} parallel FFmpeg workers...")
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            ok = list(pool.map(render, range(len(scenes))))
+
+            failed = [idx for idx, done in enumerate(ok) if not done]
+            if len(failed) == len(scenes):
+                logger.error("All segments failed to render.")
+                return False
+
+            if failed:
+                # Hand each failed scene's time to the closest rendered scene (previous first)
+                extended = set()
+                for idx in failed:
+                    rendered = [j for j in range(len(scenes)) if ok[j]]
+                    neighbour = max((j for j in rendered if j < idx), default=None)
+                    if neighbour is None:
+                        neighbour = min(j for j in rendered if j > idx)
+                    durations[neighbour] += durations[idx]
+                    extended.add(neighbour)
+                    logger.warning(f"Dropping scene {idx}; scene {neighbour} now lasts {durations[neighbour]:.2f}s")
+
+                if not all(pool.map(render, sorted(extended))):
+                    logger.error("Could not re-render segments to cover dropped scenes.")
+                    return False
+
+        # Concat demuxer list (paths quoted for the demuxer's own syntax)
+        list_path = os.path.join(temp_dir, f"{file_prefix}_segments.txt")
+        with open(list_path, "w", encoding="utf-8") as f:
+            for idx, seg_path in enumerate(seg_paths):
+                if ok[idx]:
+                    escaped = os.path.abspath(seg_path).replace("'", "'\\''")
+                    f.write(f"file '{escaped}'\n")
+
+        audio_inputs, has_bgm = self._audio_inputs(audio_path, category)
+        audio_filters, map_audio = self._audio_mix_filter(1, 2 if has_bgm else None)
+        cmd = (
+            ["ffmpeg", "-y", "-hide_banner", "-f", "concat", "-safe", "0", "-i", list_path]
+            + audio_inputs
+            + (["-filter_complex", ";".join(audio_filters)] if audio_filters else [])
+            + ["-map", "0:v", "-map", map_audio, "-c:v", "copy"]
+            + self._audio_codec_args()
+            + self._container_args()
+            + ["-shortest", output_path]
+        )
+
+        logger.info("Running FFmpeg (concat + audio mux)...")
+        try:
+            with tracer.span("mux"):
+                mux_stats = ffmpeg_runner.run(cmd, "FFmpeg concat + mux", expected_sec=sum(durations))
+            peak = max(peak_rss + [mux_stats.get("peak_rss_mb") or 0])
+            tracer.add(ffmpeg_peak_rss_mb=peak)
+            logger.info(f"Video assembled at {output_path} (peak FFmpeg memory {peak:.0f} MB per process, {workers} at a time)")
+            return True
+        except FFmpegError as e:
+            logger.error(f"FFmpeg concat failed: {e}")
             return False
 
+    def _render_segment(self, scene, idx, duration, seg_path):
+        text_overlay_path, text_x, text_y = overlay_renderer.render(scene['text'])
+
+        cmd = (
+            ["ffmpeg", "-y", "-hide_banner"]
+            + self._motion_input_args(scene['image_path'], duration)
+            + ["-loop", "1", "-t", str(duration), "-i", text_overlay_path]
+            + ["-filter_complex", ";".join(self._scene_filter(0, 1, idx, duration, (text_x, text_y)))]
+            + ["-map", f"[v{idx}_out]", "-an"]
+            + self._video_codec_args()
+            + [seg_path]
+        )
+        try:
+            return ffmpeg_runner.run(cmd, f"FFmpeg segment {idx}", expected_sec=duration)
+        except FFmpegError as e:
+            logger.error(f"FFmpeg segment {idx} failed: {e}")
+            return None
+
+    def _scene_filter(self, img_idx, text_idx, idx, duration, text_xy):
+        """
+        Filters for one scene: Ken Burns zoom on the image with the cropped
+        text overlay placed at text_xy on top. Output label: [v{idx}_out]
+        """
+        text_x, text_y = text_xy
+        return [
+            # Apply Ken Burns zoom to image
+            self._motion_filter(f"{img_idx}:v", f"v{idx}_zoom", duration),
+            # Overlay text on top of zoomed image
+            f"[v{idx}_zoom][{text_idx}:v]overlay={text_x}:{text_y}:shortest=1[v{idx}_out]",
+        ]
+
+    def _audio_inputs(self, audio_path, category):
+        """
+        Narration input, plus the category's BGM when one exists.
+        Returns (ffmpeg input args, has_bgm).
+        """
+        inputs = ["-i", audio_path]
+
+        # ✅ Add background music by category
+        bgm_path = self._get_bgm_for_category(category)
+        if bgm_path:
+            inputs.extend(["-i", bgm_path])
+            logger.info(f"Selected BGM for category='{category}': {bgm_path}")
+            return inputs, True
+
+        logger.warning(f"No BGM found for category='{category}'. Proceeding without BGM.")
+        return inputs, False
+
+    def _audio_mix_filter(self, narration_idx, bgm_idx=None):
+        """
+        Returns (filters, map_audio) mixing narration with quiet looped BGM.
+        """
+        if bgm_idx is None:
+            return [], f"{narration_idx}:a"
+
+        # Ensure narration is louder than BGM
+        # Loop bgm indefinitely; final output uses -shortest to end when narration ends.
+        return [
+            f"[{bgm_idx}:a]volume=0.1,aloop=loop=-1:size=2e+09[bgm_loop]",
+            f"[{narration_idx}:a][bgm_loop]amix=inputs=2:duration=first:dropout_transition=2[a_final]",
+        ], "[a_final]"
+
+    def _load_encoder_profiles(self):
+        profiles = {name: dict(p) for name, p in self.DEFAULT_ENCODER_PROFILES.items()}
+        for name, overrides in (config.settings.get("ENCODER_PROFILES") or {}).items():
+            profiles.setdefault(name, dict(self.DEFAULT_ENCODER_PROFILES["standard"])).update(overrides or {})
+        return profiles
+
+    def _video_codec_args(self):
+        profile = self.encoder_profiles[self.encoder_profile]
+        args = ["-c:v", "libx264", "-preset", str(profile["preset"]), "-crf", str(profile["crf"])]
+        if profile.get("tune"):
+            args += ["-tune", str(profile["tune"])]
+        if profile.get("threads"):
+            args += ["-threads", str(profile["threads"])]
+        if profile.get("gop"):
+            args += ["-g", str(profile["gop"])]
+        return args + ["-pix_fmt", "yuv420p"]
+
+    def _audio_codec_args(self):
+        profile = self.encoder_profiles[self.encoder_profile]
+        return ["-c:a", "aac", "-b:a", str(profile["audio_bitrate"])]
+
+    def _container_args(self):
+        # Put the moov atom first so YouTube can start processing before the upload finishes
+        return ["-movflags", "+faststart"]
+
+    def working_size(self, engine=None):
+        """
+        Size scene images should be stored at. Every engine starts from an
+        output-sized still (zoompan's 2x upscale is internal to its graph, and
+        decoding a pre-upscaled still costs more than FFmpeg's own upscale).
+        """
+        return (self.width, self.height)
+
+    def _motion_input_args(self, image_path, duration, engine=None):
+        """
+        FFmpeg input arguments for a scene image under the given motion engine.
+        """
+        engine = engine or self.motion_engine
+        if engine == "zoompan_once":
+            # zoompan turns one input frame into d output frames: no need to loop
+            return ["-i", image_path]
+        return ["-loop", "1", "-t", str(duration), "-i", image_path]
+
+    def _motion_filter(self, in_label, out_label, duration, engine=None):
+        """
+        Returns the filter chain that turns a still image into a zooming clip.
+        """
+        engine = engine or self.motion_engine
+        w, h = self.width, self.height
+        frames = int(duration * 30)
+        # A single input frame yields all d frames, so cut the clip to length explicitly
+        trim = f"trim=duration={duration}," if engine == "zoompan_once" else ""
+        return (
+            f"[{in_label}]scale={w}*2:-1,"
+            f"zoompan=z='min(zoom+0.0015,1.5)':d={frames}:"
+            f"x='iw/2-(iw/zoom/2)':y='ih/2-(ih/zoom/2)':s={w}x{h},"
+            f"{trim}setsar=1[{out_label}]"
+        )
+
     # ✅ New: Pick BGM by category from src/background_music/
     def _get_bgm_for_category(self, category):
         """
@@ -0,0 +1,83 @@
+import errno
+import os
+import shutil
+import time
+from functools import cached_property
+from pathlib import Path
+from src.config_loader import config
+from src.logger import logger
+
+
+class StoryWorkspace:
+    """
+    Private scratch directory for one story. Nothing in it is shared with other
+    stories, so any number of stories can render at once in the same checkout.
+    """
+
+    def __init__(self, root, story_id):
+        self.story_id = story_id
+        self.dir = Path(root) / story_id
+        self.dir.mkdir(parents=True, exist_ok=True)
+
+    def path(self, name):
+        return self.dir / name
+
+    def publish(self, src, dest):
+        """
+        Moves a finished artifact into place atomically: readers of dest see
+        either nothing or the complete file, never a partial write.
+        """
+        src, dest = Path(src), Path(dest)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.replace(src, dest)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            # Workspace on tmpfs: copy next to dest first, then rename on the same filesystem
+            partial = dest.with_name(f".{dest.name}.partial")
+            shutil.copyfile(src, partial)
+            os.replace(partial, dest)
+            src.unlink()
+        return dest
+
+    def cleanup(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+class WorkspaceManager:
+    @cached_property
+    def root(self):
+        # RAM-backed scratch space avoids disk I/O for the many intermediate files
+        if config.settings.get("WORKSPACE_TMPFS", False):
+            shm = Path("/dev/shm")
+            if shm.is_dir() and os.access(shm, os.W_OK):
+                return shm / "youtubestory"
+            logger.warning("WORKSPACE_TMPFS is set but /dev/shm is not available, using temp/")
+        return config.root_dir / "temp"
+
+    @cached_property
+    def stale_hours(self):
+        return float(config.settings.get("WORKSPACE_STALE_HOURS", 12))
+
+    def open(self, story_id):
+        return StoryWorkspace(self.root, story_id)
+
+    def sweep(self, keep=()):
+        """
+        Removes leftover workspaces untouched for WORKSPACE_STALE_HOURS, except
+        the given story ids. Recent ones may belong to another running process.
+        """
+        if not self.root.exists():
+            return
+        cutoff = time.time() - self.stale_hours * 3600
+        for p in self.root.iterdir():
+            if p.name in keep or p.stat().st_mtime > cutoff:
+                continue
+            if p.is_dir():
+                shutil.rmtree(p, ignore_errors=True)
+            else:
+                p.unlink(missing_ok=True)
+
+
+workspace_manager = WorkspaceManager()
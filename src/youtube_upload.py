@@ -1,43 +1,119 @@
 import os
-import google_auth_oauthlib.flow
-import googleapiclient.discovery
-import googleapiclient.errors
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
+import threading
+import time
+from functools import cached_property
 from src.config_loader import config
 from src.logger import logger
+from src.http_client import http_client
+from src.tracing import tracer
 import json
 
+# Resumable upload chunks must be a multiple of 256 KiB
+CHUNK_GRANULARITY = 256 * 1024
+
 class YouTubeUploader:
+    """
+    Builds the YouTube service once per run and reuses it for every upload.
+    The discovery document comes from the copy bundled with
+    google-api-python-client (static_discovery), so no fetch or parse per
+    upload, and the access token is refreshed only when it is missing or
+    expired. The service is not thread safe: upload from one thread at a time.
+    The Google client libraries are imported on the first upload.
+    """
+
+    RETRY_STATUSES = {500, 502, 503, 504}
+
     def __init__(self):
         self.scopes = ["https://www.googleapis.com/auth/youtube.upload"]
-        self.client_id = config.youtube_client_id
-        self.client_secret = config.youtube_client_secret
-        self.refresh_token = config.youtube_refresh_token
-        
+        self._creds = None
+        self._service = None
+        self._lock = threading.Lock()
+
+    @cached_property
+    def chunk_size(self):
+        chunk_mb = float(config.settings.get("YOUTUBE_CHUNK_MB", 8))
+        # 0 = whole file in one request; otherwise rounded down to the 256 KiB grid
+        return -1 if chunk_mb <= 0 else max(
+            CHUNK_GRANULARITY, int(chunk_mb * 1024 * 1024) // CHUNK_GRANULARITY * CHUNK_GRANULARITY
+        )
+
+    @cached_property
+    def chunk_retries(self):
+        return int(config.settings.get("YOUTUBE_CHUNK_RETRIES", 5))
+
+    def _refresh_if_needed(self):
+        # A credential built from a refresh token starts without an access token
+        if self._creds.valid:
+            return True
+        from google.auth.transport.requests import Request
+        try:
+            self._creds.refresh(Request(session=http_client.session))
+            return True
+        except Exception as e:
+            logger.error(f"Failed to refresh token: {e}")
+            return False
+
     def get_authenticated_service(self):
-        if not self.refresh_token:
+        refresh_token = config.youtube_refresh_token
+        if not refresh_token:
             logger.error("No refresh token found.")
             return None
 
-        # Create credentials object from Refresh Token
-        creds_data = {
-            "client_id": self.client_id,
-            "client_secret": self.client_secret,
-            "refresh_token": self.refresh_token,
-            "token_uri": "https://oauth2.googleapis.com/token",
-        }
-        
-        creds = Credentials.from_authorized_user_info(creds_data, self.scopes)
+        import googleapiclient.discovery
+        from google.oauth2.credentials import Credentials
 
-        if creds and creds.expired and creds.refresh_token:
-            try:
-                creds.refresh(Request())
-            except Exception as e:
-                logger.error(f"Failed to refresh token: {e}")
+        with self._lock:
+            if self._creds is None:
+                # Create credentials object from Refresh Token
+                creds_data = {
+                    "client_id": config.youtube_client_id,
+                    "client_secret": config.youtube_client_secret,
+                    "refresh_token": refresh_token,
+                    "token_uri": "https://oauth2.googleapis.com/token",
+                }
+                self._creds = Credentials.from_authorized_user_info(creds_data, self.scopes)
+
+            if not self._refresh_if_needed():
                 return None
 
-        return googleapiclient.discovery.build("youtube", "v3", credentials=creds)
+            if self._service is None:
+                self._service = googleapiclient.discovery.build(
+                    "youtube", "v3", credentials=self._creds, static_discovery=True, cache_discovery=False
+                )
+            return self._service
+
+    def _upload_chunks(self, request):
+        """
+        Sends the upload chunk by chunk. After a transient failure next_chunk()
+        first asks the server how many bytes it has, then resumes from that
+        offset, so a retry never resends what already arrived.
+        """
+        import googleapiclient.errors
+        response = None
+        failures = 0
+        while response is None:
+            try:
+                status, response = request.next_chunk()
+                failures = 0
+                if status:
+                    logger.info(f"Uploaded {int(status.progress() * 100)}%")
+            except googleapiclient.errors.HttpError as e:
+                if e.resp.status not in self.RETRY_STATUSES or failures >= self.chunk_retries:
+                    raise
+                failures += 1
+                self._wait_before_retry(failures, f"HTTP {e.resp.status}")
+            except (ConnectionError, TimeoutError, OSError) as e:
+                if failures >= self.chunk_retries:
+                    raise
+                failures += 1
+                self._wait_before_retry(failures, str(e))
+        return response
+
+    def _wait_before_retry(self, failures, reason):
+        wait = http_client.retry_delay(failures, base=2.0)
+        logger.warning(f"Upload chunk failed ({reason}), resuming in {wait:.1f}s ({failures}/{self.chunk_retries})")
+        tracer.add(retries=1)
+        time.sleep(wait)
 
     def upload_video(self, video_path, title, description, tags, publish_at_iso):
         youtube = self.get_authenticated_service()
@@ -59,20 +135,18 @@ class YouTubeUploader:
         }
 
         logger.info(f"Uploading {title} scheduled for {publish_at_iso}")
-        
+
+        import googleapiclient.errors
+        from googleapiclient.http import MediaFileUpload
+
         try:
             # Resumable upload
             request = youtube.videos().insert(
                 part=",".join(body.keys()),
                 body=body,
-                media_body=googleapiclient.http.MediaFileUpload(video_path, chunksize=-1, resumable=True)
+                media_body=MediaFileUpload(video_path, chunksize=self.chunk_size, resumable=True)
             )
-            
-            response = None
-            while response is None:
-                status, response = request.next_chunk()
-                if status:
-                    logger.info(f"Uploaded {int(status.progress() * 100)}%")
+            response = self._upload_chunks(request)
 
             video_id = response.get("id")
             logger.info(f"Upload Complete! Video ID: {video_id}")